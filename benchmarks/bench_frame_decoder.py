@@ -0,0 +1,92 @@
+#? Microbenchmark: byte-by-byte get_message (original implementation) vs. frame_decoder
+#? usage: python benchmarks/bench_frame_decoder.py [--frames N] [--chunk BYTES]
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main_server import SUFFIX, CLIENT_MESSAGES_MAX_LEN, frame_decoder, check_suffix
+
+
+class fake_conn:
+    #? replays a byte stream in chunks of the given size, like a socket would
+    def __init__(self, data: bytes, chunk: int):
+        self.data = memoryview(data)
+        self.chunk = chunk
+        self.position = 0
+
+    def recv(self, size: int):
+        size = min(size, self.chunk)
+        data = bytes(self.data[self.position:self.position + size])
+        self.position += len(data)
+        return data
+
+    def recv_into(self, buffer, size: int = 0):
+        size = min(size or len(buffer), self.chunk)
+        data = self.data[self.position:self.position + size]
+        buffer[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+
+def legacy_frames(conn, count: int, max_len: int):
+    #? the original get_message loop: one Python iteration and two slices per byte
+    buffer = b''
+    for _ in range(count):
+        msg = b''
+        while True:
+            if len(buffer) == 0:
+                buffer += conn.recv(1024)
+            else:
+                msg += buffer[:1]
+                buffer = buffer[1:]
+                if len(msg) == max_len:
+                    check_suffix(msg)
+                    break
+                if msg[-2:] == SUFFIX:
+                    break
+
+
+def decoder_frames(conn, count: int, max_len: int):
+    frames = frame_decoder()
+    for _ in range(count):
+        while frames.next_frame(max_len) is None:
+            frames.recv_from(conn)
+
+
+def run(name: str, function, stream: bytes, count: int, chunk: int, max_len: int, repeat: int):
+    timer = timeit.Timer(lambda: function(fake_conn(stream, chunk), count, max_len))
+    best = min(timer.repeat(repeat = repeat, number = 1))
+    print(f"  {name:<10} {best * 1000:9.2f} ms   {count / best:12,.0f} frames/s")
+    return best
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "frame decoder microbenchmark")
+    parser.add_argument("--frames", type = int, default = 20000)
+    parser.add_argument("--repeat", type = int, default = 5)
+    args = parser.parse_args(argv)
+
+    workloads = {
+        "CLIENT_OK":        b"OK -12 -45" + SUFFIX,
+        "CLIENT_USERNAME":  b"Oompa Loompa 12345" + SUFFIX,
+        "CLIENT_MESSAGE":   b"x" * 98 + SUFFIX,
+    }
+    for message_type, frame in workloads.items():
+        max_len = max(CLIENT_MESSAGES_MAX_LEN[message_type], CLIENT_MESSAGES_MAX_LEN["CLIENT_RECHARGING"])
+        stream = frame * args.frames
+        #? chunk = len(frame) is one frame per recv, 1 splits every frame (and every SUFFIX) into single bytes,
+        #? 1024 is a coalesced burst of frames in one recv
+        for chunk in (len(frame), 1, 1024):
+            print(f"{message_type} ({len(frame)} B frames, {chunk} B per recv)")
+            legacy = run("legacy", legacy_frames, stream, args.frames, chunk, max_len, args.repeat)
+            decoder = run("decoder", decoder_frames, stream, args.frames, chunk, max_len, args.repeat)
+            #? one byte per recv: a recv_into and a next_frame call per byte, the legacy loop only slices one byte
+            slower = "   (slower: one recv per byte)" if decoder > legacy else ""
+            print(f"  speedup    {legacy / decoder:9.2f}x{slower}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+#? Benchmark of the protocol logic alone: robot_session driven by a virtual robot, no sockets involved
+#? usage: python benchmarks/bench_session.py [--sessions N] [--grid SIZE] [--obstacles N]
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main_server import SUFFIX, SERVER_CLIENT_KEYS, SERVER_MESSAGES, NAVIGATION_MODES, robot_session, server_config
+
+#* (dx, dy) for UP, RIGHT, DOWN, LEFT -> turning right = +1
+STEPS = ((0, 1), (1, 0), (0, -1), (-1, 0))
+#* a session sending more commands than this is counted as looping (e.g. the robot is walled in)
+MAX_COMMANDS = 2000
+
+
+class virtual_robot:
+    #? answers the server's messages like a robot on a grid with obstacles would
+    def __init__(self, seed: int, grid: int, obstacles: int, names: int = 0):
+        generator = random.Random(seed)
+        self.username = b"Robot %d" % (seed % names if names else seed)     #? names > 0 -> the fleet shares that many names
+        self.key_ID = seed % len(SERVER_CLIENT_KEYS)
+        self.position = (generator.randint(-grid, grid), generator.randint(-grid, grid))
+        self.direction = generator.randrange(4)
+        self.obstacles = {(generator.randint(-grid, grid), generator.randint(-grid, grid)) for _ in range(obstacles)}
+        self.obstacles -= {(0, 0), self.position}
+
+    def first_message(self):
+        return self.username + SUFFIX
+
+    def reply(self, message: bytes):
+        if message == SERVER_MESSAGES["SERVER_KEY_REQUEST"]:
+            return b"%d" % self.key_ID + SUFFIX
+        if message == SERVER_MESSAGES["SERVER_OK"] or message == SERVER_MESSAGES["SERVER_LOGOUT"]:
+            return None
+        if message == SERVER_MESSAGES["SERVER_PICK_UP"]:
+            return b"secret message" + SUFFIX
+        if message == SERVER_MESSAGES["SERVER_MOVE"]:
+            x, y = self.position
+            dx, dy = STEPS[self.direction]
+            if (x + dx, y + dy) not in self.obstacles:
+                self.position = (x + dx, y + dy)
+        elif message == SERVER_MESSAGES["SERVER_TURN_LEFT"]:
+            self.direction = (self.direction - 1) % 4
+        elif message == SERVER_MESSAGES["SERVER_TURN_RIGHT"]:
+            self.direction = (self.direction + 1) % 4
+        elif message.endswith(SUFFIX) and message[:-2].isdigit():
+            #? SERVER_CONFIRMATION -> answer with our own confirmation key
+            hash_value = (sum(self.username) * 1000) % 65536
+            return b"%d" % ((hash_value + SERVER_CLIENT_KEYS[self.key_ID][1]) % 65536) + SUFFIX
+        else:
+            raise RuntimeError(f"unexpected message {message!r}")
+        return b"OK %d %d" % self.position + SUFFIX
+
+
+def split_frames(data: bytes):
+    frames = []
+    while data:
+        end = data.index(SUFFIX) + 2
+        frames.append(data[:end])
+        data = data[end:]
+    return frames
+
+
+def run_session(robot: virtual_robot, config: server_config, now: float):
+    #? returns the number of commands sent, -1 if the session was looping
+    session = robot_session(now, config)
+    data = session.receive_data(robot.first_message(), now)
+    while not session.closed:
+        if session.robot.commands > MAX_COMMANDS:
+            return -1
+        replies = [robot.reply(message) for message in split_frames(data)]
+        data = session.receive_data(b"".join(reply for reply in replies if reply), now)
+    return session.robot.commands
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "sans-IO session benchmark")
+    parser.add_argument("--sessions", type = int, default = 2000)
+    parser.add_argument("--grid", type = int, default = 10)
+    parser.add_argument("--obstacles", type = int, default = 20)
+    parser.add_argument("--navigation", choices = NAVIGATION_MODES, default = "planner")
+    parser.add_argument("--names", type = int, default = 0, help = "usernames shared by the robots (0 = every robot has its own)")
+    args = parser.parse_args(argv)
+
+    config = server_config(args.navigation)
+    robots = [virtual_robot(seed, args.grid, args.obstacles, args.names) for seed in range(args.sessions)]
+    commands = looping = 0
+    started = time.perf_counter()
+    for robot in robots:
+        sent = run_session(robot, config, started)
+        if sent == -1:
+            looping += 1
+        else:
+            commands += sent
+    elapsed = time.perf_counter() - started
+
+    finished = args.sessions - looping
+    print(f"{args.sessions} sessions in {elapsed:.3f} s -> {args.sessions / elapsed:,.0f} sessions/s")
+    print(f"commands per finished session: {commands / max(finished, 1):.2f}, looping sessions: {looping}")
+
+
+if __name__ == '__main__':
+    main()
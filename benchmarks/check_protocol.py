@@ -0,0 +1,154 @@
+#? Replies of robot_session to malformed or unusual frames, compared to what the protocol expects, and replies going
+#? out through frame_writer / transport_writer when the socket takes only a part of them
+#? usage: python benchmarks/check_protocol.py (exits with 1 if any case differs)
+import argparse
+import os
+import socket
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main_server import SUFFIX, SERVER_MESSAGES, robot_session, server_config, frame_writer, transport_writer
+
+KEY_REQUEST = SERVER_MESSAGES["SERVER_KEY_REQUEST"]
+CONFIRMATION = b"44893" + SUFFIX                            # SERVER_CONFIRMATION of "Bob" with key ID 1
+#* (name, writes of the robot, replies of the server, is the session closed afterwards)
+CASES = (
+    ("key ID",                      [b"Bob" + SUFFIX, b"1" + SUFFIX], KEY_REQUEST + CONFIRMATION, False),
+    ("key ID not a number",         [b"Bob" + SUFFIX, b"x1" + SUFFIX], KEY_REQUEST + SERVER_MESSAGES["SERVER_SYNTAX_ERROR"], True),
+    ("key ID out of range",         [b"Bob" + SUFFIX, b"123" + SUFFIX], KEY_REQUEST + SERVER_MESSAGES["SERVER_KEY_OUT_OF_RANGE_ERROR"], True),
+    ("key ID too long",             [b"Bob" + SUFFIX, b"1234"], KEY_REQUEST + SERVER_MESSAGES["SERVER_SYNTAX_ERROR"], True),
+    ("confirmation wrong",          [b"Bob" + SUFFIX, b"1" + SUFFIX, b"123" + SUFFIX],
+     KEY_REQUEST + CONFIRMATION + SERVER_MESSAGES["SERVER_LOGIN_FAILED"], True),
+    ("confirmation too long",       [b"Bob" + SUFFIX, b"1" + SUFFIX, b"123456" + SUFFIX],
+     KEY_REQUEST + CONFIRMATION + SERVER_MESSAGES["SERVER_SYNTAX_ERROR"], True),
+    ("confirmation too long, open", [b"Bob" + SUFFIX, b"1" + SUFFIX, b"1234567"],
+     KEY_REQUEST + CONFIRMATION + SERVER_MESSAGES["SERVER_SYNTAX_ERROR"], True),
+    ("confirmation 5 digits, open", [b"Bob" + SUFFIX, b"1" + SUFFIX, b"12345"], KEY_REQUEST + CONFIRMATION, False),
+    ("recharging instead of key",   [b"Bob" + SUFFIX, b"RECHARGING" + SUFFIX], KEY_REQUEST, False),
+    ("OK with extra space",         [b"Bob" + SUFFIX, b"1" + SUFFIX, b"42151" + SUFFIX, b"OK  1 2" + SUFFIX],
+     KEY_REQUEST + CONFIRMATION + SERVER_MESSAGES["SERVER_OK"] + SERVER_MESSAGES["SERVER_TURN_RIGHT"]
+     + SERVER_MESSAGES["SERVER_SYNTAX_ERROR"], True),
+)
+
+
+def run_case(writes: list):
+    session = robot_session(0.0, server_config("planner"))
+    replies = b""
+    for data in writes:
+        if session.closed:
+            break
+        replies += session.receive_data(data, 0.0)
+    return replies, session.closed
+
+
+#* replies of a long navigation, more than a socket buffer (and one sendmsg, SC_IOV_MAX) takes at once
+WRITER_FRAMES = [SERVER_MESSAGES[name] for name in ("SERVER_MOVE", "SERVER_TURN_LEFT", "SERVER_TURN_RIGHT")] * 20000
+
+
+class partial_socket:
+    #? takes at most `size` bytes per sendmsg and is full (BlockingIOError) every `full`-th call;
+    #? select() waits on a real socket that is always writable
+    def __init__(self, size: int, full: int, writable: socket.socket):
+        self.size, self.full, self.calls = size, full, 0
+        self.received = bytearray()
+        self.writable = writable
+
+    def sendmsg(self, frames: list):
+        self.calls += 1
+        if self.calls % self.full == 0:
+            raise BlockingIOError
+        data = b"".join(frames)[:self.size]
+        self.received += data
+        return len(data)
+
+    send = lambda self, data: self.sendmsg([data])
+
+    def fileno(self):
+        return self.writable.fileno()
+
+
+class fake_transport:
+    def __init__(self):
+        self.received = bytearray()
+
+    def writelines(self, frames: list):
+        for frame in frames:
+            self.received += frame
+
+
+def partial_sends():
+    writable, other = socket.socketpair()
+    conn = partial_socket(5, 4, writable)
+    frames = [bytes(frame) for frame in WRITER_FRAMES[:1500]]
+    frame_writer(conn, frames).flush()
+    writable.close(), other.close()
+    return bytes(conn.received), b"".join(WRITER_FRAMES[:1500]), frames
+
+
+#? a real non-blocking socket with a small send buffer and a slow reader: flush waits until everything is out
+def full_socket():
+    sender, reader = socket.socketpair()
+    sender.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+    sender.setblocking(False)
+    received = bytearray()
+
+    def read():
+        while True:
+            data = reader.recv(1024)
+            if not data:
+                break
+            received.extend(data)
+    thread = threading.Thread(target = read)
+    thread.start()
+    frames = list(WRITER_FRAMES)
+    frame_writer(sender, frames).flush()
+    sender.close()
+    thread.join()
+    reader.close()
+    return bytes(received), b"".join(WRITER_FRAMES), frames
+
+
+def transport_writes():
+    transport = fake_transport()
+    frames = list(WRITER_FRAMES[:100])
+    transport_writer(transport, frames).flush()
+    return bytes(transport.received), b"".join(WRITER_FRAMES[:100]), frames
+
+
+#* (name, function returning (bytes sent, bytes expected, frames left in the outbox))
+WRITER_CASES = (
+    ("frame_writer, 5 B per send, full every 4th", partial_sends),
+    ("frame_writer, non-blocking socket, full",    full_socket),
+    ("transport_writer",                           transport_writes),
+)
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "protocol replies to malformed frames")
+    parser.parse_args(argv)
+
+    failed = 0
+    for name, writes, expected, closed in CASES:
+        replies, is_closed = run_case(writes)
+        if replies == expected and is_closed == closed:
+            print(f"  ok      {name}")
+        else:
+            failed += 1
+            print(f"  FAILED  {name}: {replies!r} (closed: {is_closed}), expected {expected!r} (closed: {closed})")
+    for name, function in WRITER_CASES:
+        sent, expected, left = function()
+        if sent == expected and not left:
+            print(f"  ok      {name}")
+        else:
+            failed += 1
+            print(f"  FAILED  {name}: {len(sent)} B sent ({'in order' if expected.startswith(sent) else 'out of order'}), "
+                  f"expected {len(expected)} B, {len(left)} frames left")
+    cases = len(CASES) + len(WRITER_CASES)
+    print(f"{cases - failed} of {cases} cases as expected")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,194 @@
+#? Load generator: a fleet of simulated robots speaking the whole protocol to a running server over TCP
+#? usage: python benchmarks/load_fleet.py [--port 3999] [--sessions N] [--concurrency N] [--server "--mode asyncio ..."]
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import shlex
+import socket
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main_server import SUFFIX, SERVER_MESSAGES, CLIENT_RECHARGING_MESSAGES, raise_open_files_limit
+from bench_session import virtual_robot, MAX_COMMANDS
+
+#* server's error messages -> name of the result
+ERROR_RESULTS = {message: name for name, message in SERVER_MESSAGES.items() if message.startswith(b"3")}
+LATENCY_PERCENTILES = (50, 90, 99)
+
+
+class fleet_robot(virtual_robot):
+    #? virtual_robot + the way real robots write: fragmented or coalesced messages and recharging at random moments
+    def __init__(self, seed: int, args: argparse.Namespace):
+        super().__init__(seed, args.grid, args.obstacles, args.names)
+        self.random = random.Random(~seed)
+        self.args = args
+        self.commands = 0
+        self.answered = False                                   # the server sent anything at all
+
+    async def write(self, writer: asyncio.StreamWriter, data: bytes):
+        args = self.args
+        if self.random.random() < args.recharge:
+            if args.recharge_time:
+                writer.write(CLIENT_RECHARGING_MESSAGES["CLIENT_RECHARGING"])
+                await writer.drain()
+                await asyncio.sleep(self.random.random() * args.recharge_time)
+                data = CLIENT_RECHARGING_MESSAGES["CLIENT_FULL_POWER"] + data
+            else:                                               #? the whole recharge arrives in one write
+                data = CLIENT_RECHARGING_MESSAGES["CLIENT_RECHARGING"] + CLIENT_RECHARGING_MESSAGES["CLIENT_FULL_POWER"] + data
+        if len(data) > 1 and self.random.random() < args.fragment:
+            cuts = sorted(self.random.sample(range(1, len(data)), min(len(data) - 1, self.random.randint(1, 3))))
+            for start, end in zip([0] + cuts, cuts + [len(data)]):
+                writer.write(data[start:end])
+                await writer.drain()
+                await asyncio.sleep(args.fragment_delay)
+            return None
+        writer.write(data)
+        await writer.drain()
+
+    #? returns the result of the session: "completed", a SERVER_MESSAGES error name, "CLOSED", "REJECTED" or "LOOPING"
+    async def run(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        key_sent = self.random.random() < self.args.coalesce
+        if key_sent:                                            #? username and key ID in one write, before the KEY REQUEST
+            await self.write(writer, self.first_message() + self.reply(SERVER_MESSAGES["SERVER_KEY_REQUEST"]))
+        else:
+            await self.write(writer, self.first_message())
+        while True:
+            try:
+                message = await reader.readuntil(SUFFIX)
+            except asyncio.IncompleteReadError:
+                return "CLOSED" if self.answered else "REJECTED"
+            self.answered = True
+            if message in ERROR_RESULTS:
+                return ERROR_RESULTS[message]
+            if message == SERVER_MESSAGES["SERVER_LOGOUT"]:
+                return "completed"
+            if message == SERVER_MESSAGES["SERVER_KEY_REQUEST"] and key_sent:
+                continue
+            if message in (SERVER_MESSAGES["SERVER_MOVE"], SERVER_MESSAGES["SERVER_TURN_LEFT"], SERVER_MESSAGES["SERVER_TURN_RIGHT"]):
+                self.commands += 1
+                if self.commands > MAX_COMMANDS:
+                    return "LOOPING"
+            reply = self.reply(message)
+            if reply:
+                await self.write(writer, reply)
+
+
+async def run_robot(seed: int, args: argparse.Namespace, limit: asyncio.Semaphore, results: list):
+    robot = fleet_robot(seed, args)
+    async with limit:
+        started = time.perf_counter()
+        try:
+            reader, writer = await asyncio.open_connection(args.host, args.port)
+        except OSError:
+            results.append(("CONNECT_FAILED", 0.0, 0))
+            return None
+        writer.get_extra_info("socket").setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            result = await asyncio.wait_for(robot.run(reader, writer), args.timeout)
+        except asyncio.TimeoutError:
+            result = "CLIENT_TIMEOUT"
+        except (ConnectionError, OSError):
+            result = "CLOSED" if robot.answered else "REJECTED"
+        results.append((result, time.perf_counter() - started, robot.commands))
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except (ConnectionError, OSError):
+            pass
+
+
+async def run_fleet(args: argparse.Namespace, seeds: range, concurrency: int):
+    limit = asyncio.Semaphore(concurrency)
+    results = []
+    await asyncio.gather(*(run_robot(seed, args, limit, results) for seed in seeds))
+    return results
+
+
+#? one client process is soon the bottleneck itself -> --processes splits the fleet between several event loops
+def run_fleet_process(args: argparse.Namespace, process: int):
+    raise_open_files_limit()
+    seeds = range(args.seed + process, args.seed + args.sessions, args.processes)
+    return asyncio.run(run_fleet(args, seeds, max(args.concurrency // args.processes, 1)))
+
+
+def percentile(values: list, percent: float):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def report(results: list, elapsed: float, args: argparse.Namespace):
+    latencies = sorted(latency for result, latency, commands in results if result == "completed")
+    commands = [commands for result, latency, commands in results if result == "completed"]
+    counts = {}
+    for result, latency, _ in results:
+        counts[result] = counts.get(result, 0) + 1
+
+    print(f"{len(results)} sessions in {elapsed:.2f} s -> {len(results) / elapsed:,.0f} sessions/s (concurrency {args.concurrency})")
+    print("latency of completed sessions: " + ", ".join(f"p{p} {percentile(latencies, p) * 1000:.1f} ms" for p in LATENCY_PERCENTILES)
+          + f", max {(latencies[-1] if latencies else 0) * 1000:.1f} ms")
+    print(f"commands per completed session: {sum(commands) / max(len(commands), 1):.2f}")
+    for result, count in sorted(counts.items(), key = lambda item: -item[1]):
+        print(f"  {result:<32} {count:8} {count / len(results):8.2%}")
+
+
+#? --server: start main_server.py ourselves and stop it when the fleet is done
+def start_server(args: argparse.Namespace):
+    server_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main_server.py")
+    command = [sys.executable, server_path, "--host", args.host, "--port", str(args.port)] + shlex.split(args.server)
+    process = subprocess.Popen(command, stdout = subprocess.DEVNULL)
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((args.host, args.port), timeout = 1).close()
+            return process
+        except OSError:
+            if process.poll() is not None:
+                break
+            time.sleep(0.05)
+    process.kill()
+    raise SystemExit(f"server {command} didn't start")
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "simulated robot fleet")
+    parser.add_argument("--host", default = "127.0.0.1")
+    parser.add_argument("--port", type = int, default = 3999)
+    parser.add_argument("--sessions", type = int, default = 5000)
+    parser.add_argument("--concurrency", type = int, default = 1000, help = "sessions open at the same time")
+    parser.add_argument("--grid", type = int, default = 10)
+    parser.add_argument("--obstacles", type = int, default = 20)
+    parser.add_argument("--names", type = int, default = 0, help = "usernames shared by the robots (0 = every robot has its own)")
+    parser.add_argument("--recharge", type = float, default = 0.02, help = "probability that a robot recharges before a reply")
+    parser.add_argument("--recharge-time", type = float, default = 0.1, help = "(s) max. recharging time, 0 = RECHARGING and FULL POWER in one write")
+    parser.add_argument("--fragment", type = float, default = 0.1, help = "probability that a write is split into several")
+    parser.add_argument("--fragment-delay", type = float, default = 0.001, help = "(s) between the parts of a fragmented write")
+    parser.add_argument("--coalesce", type = float, default = 0.1, help = "probability of sending username and key ID in one write")
+    parser.add_argument("--timeout", type = float, default = 30, help = "(s) a session taking longer is counted as CLIENT_TIMEOUT")
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--processes", type = int, default = 1, help = "client processes the fleet is split between")
+    parser.add_argument("--server", default = None, help = "start main_server.py with these arguments for the run")
+    args = parser.parse_args(argv)
+
+    server = start_server(args) if args.server is not None else None
+    try:
+        started = time.perf_counter()
+        if args.processes > 1:
+            with multiprocessing.Pool(args.processes) as pool:
+                results = sum(pool.starmap(run_fleet_process, [(args, process) for process in range(args.processes)]), [])
+        else:
+            results = run_fleet_process(args, 0)
+        report(results, time.perf_counter() - started, args)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
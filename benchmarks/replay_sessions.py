@@ -0,0 +1,136 @@
+#? Replays sessions recorded with main_server.py --record, against a running server or straight into robot_session
+#? usage: python benchmarks/replay_sessions.py RECORDING [--target server|session] [--timing fast|original] [--port 3999]
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main_server import (RECORD_RECEIVED, RECORD_SENT, NAVIGATION_MODES, robot_session, server_config, read_recording,
+                         raise_open_files_limit)
+from load_fleet import percentile, LATENCY_PERCENTILES
+
+#* how long the replay waits for the server's replies or for it to close the connection (its own deadlines are 1 s / 5 s)
+REPLY_TIMEOUT = 10
+
+
+def recorded_output(records: list):
+    return b''.join(data for _, kind, data in records if kind == RECORD_SENT)
+
+
+#? In-process replay: the recorded timestamps are the session's clock, so deadlines and stage timings come out
+#? as they were, without waiting for them
+def replay_session(records: list, config: server_config):
+    session = robot_session(0.0, config)
+    output = []
+    for seconds, kind, data in records:
+        if session.closed:
+            break
+        if kind == RECORD_RECEIVED:
+            output.append(session.receive_data(data, seconds))
+        elif kind != RECORD_SENT:                              #? RECORD_CLOSED: the robot left or its deadline passed
+            if seconds >= session.deadline:
+                session.expire(seconds)
+    return b''.join(output)
+
+
+def replay_in_process(sessions: list, args: argparse.Namespace):
+    config = server_config(args.navigation)
+    results = []
+    started = time.perf_counter()
+    for records in sessions:
+        session_started = time.perf_counter()
+        output = replay_session(records, config)
+        results.append((output == recorded_output(records), time.perf_counter() - session_started))
+    return results, time.perf_counter() - started
+
+
+#? fast: every recorded recv is sent as soon as the server sent what it had sent before it (the robot's reply
+#? can't come earlier); original: additionally not before its recorded time. Each recv is one write, so the
+#? recorded fragmentation and coalescing are kept.
+async def replay_connection(records: list, args: argparse.Namespace, limit: asyncio.Semaphore, results: list):
+    async with limit:
+        started = time.perf_counter()
+        try:
+            reader, writer = await asyncio.open_connection(args.host, args.port)
+        except OSError:
+            results.append((False, 0.0))
+            return None
+        writer.get_extra_info("socket").setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        received = bytearray()
+        expected = 0                                            # bytes the server had sent at this point of the recording
+        try:
+            for seconds, kind, data in records:
+                if kind == RECORD_SENT:
+                    expected += len(data)
+                    continue
+                while len(received) < expected:
+                    chunk = await asyncio.wait_for(reader.read(4096), REPLY_TIMEOUT)
+                    if not chunk:
+                        break
+                    received += chunk
+                if kind != RECORD_RECEIVED:
+                    break
+                if args.timing == "original":
+                    await asyncio.sleep(started + seconds - time.perf_counter())
+                writer.write(data)
+                await writer.drain()
+            while True:                                         #? the rest, until the server closes the connection
+                chunk = await asyncio.wait_for(reader.read(4096), REPLY_TIMEOUT)
+                if not chunk:
+                    break
+                received += chunk
+        except (asyncio.TimeoutError, ConnectionError, OSError):
+            pass
+        results.append((bytes(received) == recorded_output(records), time.perf_counter() - started))
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except (ConnectionError, OSError):
+            pass
+
+
+async def replay_against_server(sessions: list, args: argparse.Namespace):
+    limit = asyncio.Semaphore(args.concurrency)
+    results = []
+    started = time.perf_counter()
+    await asyncio.gather(*(replay_connection(records, args, limit, results) for records in sessions))
+    return results, time.perf_counter() - started
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "replay of recorded sessions")
+    parser.add_argument("recording")
+    parser.add_argument("--target", choices = ("server", "session"), default = "server",
+                        help = "a running server over TCP, or robot_session in this process")
+    parser.add_argument("--timing", choices = ("fast", "original"), default = "fast", help = "server target: as fast as possible or at the recorded times")
+    parser.add_argument("--host", default = "127.0.0.1")
+    parser.add_argument("--port", type = int, default = 3999)
+    parser.add_argument("--concurrency", type = int, default = 1000, help = "server target: sessions replayed at the same time")
+    parser.add_argument("--navigation", choices = NAVIGATION_MODES, default = "planner", help = "session target: strategy of the replayed sessions")
+    parser.add_argument("--limit", type = int, default = 0, help = "replay only the first N sessions (0 = all)")
+    args = parser.parse_args(argv)
+
+    sessions = []
+    for _, _, records in read_recording(args.recording):
+        sessions.append(records)
+        if len(sessions) == args.limit:
+            break
+    if args.target == "session":
+        results, elapsed = replay_in_process(sessions, args)
+    else:
+        raise_open_files_limit()
+        results, elapsed = asyncio.run(replay_against_server(sessions, args))
+
+    identical = sum(same for same, _ in results)
+    latencies = sorted(latency for _, latency in results)
+    print(f"{len(results)} sessions in {elapsed:.3f} s -> {len(results) / max(elapsed, 1e-9):,.0f} sessions/s ({args.target}, {args.timing})")
+    print("session time: " + ", ".join(f"p{p} {percentile(latencies, p) * 1000:.2f} ms" for p in LATENCY_PERCENTILES))
+    print(f"replies identical to the recording: {identical}, different: {len(results) - identical}")
+
+
+if __name__ == '__main__':
+    main()
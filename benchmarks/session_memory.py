@@ -0,0 +1,65 @@
+#? Memory footprint of one session: tracemalloc over thousands of robot_sessions kept open in the middle of navigation
+#? usage: python benchmarks/session_memory.py [--sessions N] [--exchanges N] [--navigation planner]
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main_server import NAVIGATION_MODES, robot_session, server_config
+from bench_session import virtual_robot, split_frames
+
+TOP_LINES = 10
+
+
+#? a session after the given number of exchanges with its robot (still open, unless the robot got to [0, 0] sooner)
+def open_session(robot: virtual_robot, config: server_config, exchanges: int):
+    session = robot_session(0.0, config)
+    data = session.receive_data(robot.first_message(), 0.0)
+    for _ in range(exchanges):
+        if session.closed:
+            break
+        replies = [robot.reply(message) for message in split_frames(data)]
+        data = session.receive_data(b"".join(reply for reply in replies if reply), 0.0)
+    return session
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "per-session memory footprint")
+    parser.add_argument("--sessions", type = int, default = 10000)
+    parser.add_argument("--exchanges", type = int, default = 8, help = "messages of each robot before the measurement (8 = navigating)")
+    parser.add_argument("--navigation", choices = NAVIGATION_MODES, default = "planner")
+    parser.add_argument("--grid", type = int, default = 10)
+    parser.add_argument("--obstacles", type = int, default = 20)
+    parser.add_argument("--names", type = int, default = 100, help = "usernames shared by the robots (0 = every robot has its own)")
+    args = parser.parse_args(argv)
+
+    config = server_config(args.navigation)
+    #? the login cache is shared by all sessions -> filled before the measurement
+    for robot in [virtual_robot(seed, args.grid, args.obstacles, args.names) for seed in range(args.sessions)]:
+        open_session(robot, config, 2)
+    robots = [virtual_robot(seed, args.grid, args.obstacles, args.names) for seed in range(args.sessions)]
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    sessions = [open_session(robot, config, args.exchanges) for robot in robots]
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    only_server = [tracemalloc.Filter(True, "*main_server.py")]
+    statistics = after.filter_traces(only_server).compare_to(before.filter_traces(only_server), "lineno")
+    total = sum(statistic.size_diff for statistic in statistics)
+    still_open = sum(not session.closed for session in sessions)
+    print(f"{len(sessions)} sessions ({still_open} still open) after {args.exchanges} exchanges: "
+          f"{total / len(sessions):,.0f} B per session, {total / 1024 / 1024:.1f} MiB together")
+    for statistic in statistics[:TOP_LINES]:
+        frame = statistic.traceback[0]
+        print(f"  {statistic.size_diff / len(sessions):8,.0f} B  {os.path.basename(frame.filename)}:{frame.lineno}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,270 @@
+#? Batch simulator of the navigation strategies: thousands of virtual robots driven in lockstep with NumPy arrays,
+#? following the same rules as navigate_robot/robot_dodge (classic and planner; search plans with A* per robot,
+#? use bench_session.py for it). Needs NumPy.
+#? usage: python benchmarks/sim_navigation.py [--scenarios N] [--grid SIZE] [--obstacles N] [--navigation classic planner]
+import argparse
+import os
+import sys
+import time
+
+try:
+    import numpy                                                #? optional, only this script needs it
+except ImportError:
+    numpy = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main_server import (DIRECTION_UP, DIRECTION_RIGHT, DIRECTION_DOWN, DIRECTION_LEFT, DIRECTION_NONE, DIRECTION_STEPS,
+                         COMMAND_TURNS, ROBOT_DODGE_COMMANDS, ROBOT_DODGE_COMMANDS_MIRRORED, ROBOT_DODGE_AXIS_CHECK, server_config)
+from bench_session import virtual_robot, run_session, MAX_COMMANDS
+
+SIM_NAVIGATION_MODES = ("classic", "planner")
+BATCH_SIZE = 100000     #* robots simulated at once (memory: BATCH_SIZE * (2 * grid + 1)^2 bytes of obstacle maps)
+DODGE_DEPTH = 32        #* nested dodges per robot; a robot going deeper is counted as looping
+PERCENTILES = (50, 90, 99)
+
+#* command codes of the simulation = COMMAND_TURNS
+MOVE, LEFT, RIGHT = COMMAND_TURNS["SERVER_MOVE"], COMMAND_TURNS["SERVER_TURN_LEFT"], COMMAND_TURNS["SERVER_TURN_RIGHT"]
+#* results
+RUNNING, COMPLETED, LOOPING = 0, 1, 2
+RESULT_NAMES = ("running", "completed", "looping")
+#* phases of the server's side
+START_POSITION, START_DIRECTION, NAVIGATION = 0, 1, 2
+
+
+#? One batch of robots: where they are and what the server knows about them.
+#? Directions are the server's DIRECTION_* codes; once the server knows the direction it is the robot's heading.
+class robot_batch:
+    def __init__(self, rng, size: int, grid: int, obstacles: int):
+        self.grid = grid
+        self.index = numpy.arange(size)
+        self.x = rng.integers(-grid, grid + 1, size)
+        self.y = rng.integers(-grid, grid + 1, size)
+        self.heading = rng.integers(0, 4, size)
+        #? obstacle maps, [robot, x + grid, y + grid]; the start and [0, 0] are always free, outside the map everything is
+        self.blocked = numpy.zeros((size, 2 * grid + 1, 2 * grid + 1), dtype = bool)
+        cells = rng.integers(0, 2 * grid + 1, (size, obstacles, 2))
+        self.blocked[numpy.repeat(self.index, obstacles), cells[:, :, 0].ravel(), cells[:, :, 1].ravel()] = True
+        self.blocked[self.index, self.x + grid, self.y + grid] = False
+        self.blocked[:, grid, grid] = False
+
+    def obstacle(self, x, y, rows):
+        size = 2 * self.grid + 1
+        column, row = x + self.grid, y + self.grid
+        inside = (column >= 0) & (column < size) & (row >= 0) & (row < size)
+        result = numpy.zeros(len(rows), dtype = bool)
+        result[inside] = self.blocked[rows[inside], column[inside], row[inside]]
+        return result
+
+    #? the same robot as a virtual_robot of bench_session (for --verify)
+    def virtual_robot(self, robot: int):
+        virtual = virtual_robot.__new__(virtual_robot)
+        virtual.username = b"Robot %d" % robot
+        virtual.key_ID = robot % 5
+        virtual.position = (int(self.x[robot]), int(self.y[robot]))
+        virtual.direction = int(self.heading[robot])
+        cells = numpy.argwhere(self.blocked[robot]) - self.grid
+        virtual.obstacles = {(int(x), int(y)) for x, y in cells}
+        return virtual
+
+
+def dodge_table():
+    #? [side, step] -> command code, side 0 = ROBOT_DODGE_COMMANDS, 1 = mirrored
+    return numpy.array([[COMMAND_TURNS[command] for command in commands]
+                        for commands in (ROBOT_DODGE_COMMANDS, ROBOT_DODGE_COMMANDS_MIRRORED)], dtype = numpy.int8)
+
+
+#? Target direction towards 0 on the axis (DIRECTION_NONE if the robot already is there)
+def axis_target(x, y, axis):
+    x_target = numpy.where(x < 0, DIRECTION_RIGHT, numpy.where(x > 0, DIRECTION_LEFT, DIRECTION_NONE))
+    y_target = numpy.where(y < 0, DIRECTION_UP, numpy.where(y > 0, DIRECTION_DOWN, DIRECTION_NONE))
+    return numpy.where(axis == 0, x_target, y_target)
+
+
+def count_turns(heading, target):
+    return numpy.where(target == DIRECTION_NONE, 0, numpy.array((0, 1, 2, 1))[(target - heading) % 4])
+
+
+#? planned_navigation_command without the dodge: axis from plan_route, the shorter turn from turn_towards
+def planner_commands(x, y, heading):
+    x_target = axis_target(x, y, 0)
+    y_target = axis_target(x, y, 1)
+    axis = numpy.where(y_target == DIRECTION_NONE, 0, numpy.where(x_target == DIRECTION_NONE, 1,
+                       numpy.where(count_turns(heading, y_target) <= count_turns(heading, x_target), 1, 0)))
+    target = numpy.where(axis == 0, x_target, y_target)
+    turn = (target - heading) % 4
+    return numpy.where(target == heading, MOVE, numpy.where(turn == 3, LEFT, RIGHT))
+
+
+#? classic_navigation_command without the dodge: the current axis until the robot is on 0, always turning right
+def classic_commands(x, y, heading, axis):
+    on_axis = numpy.where(axis == 0, x, y) == 0
+    axis[on_axis] = 1 - axis[on_axis]
+    target = axis_target(x, y, axis)
+    return numpy.where(target == heading, MOVE, RIGHT)
+
+
+#? Runs the batch until every robot completed or loops; returns (results, commands, dodges) per robot
+def simulate(batch: robot_batch, navigation: str, max_commands: int = MAX_COMMANDS):
+    size = len(batch.index)
+    steps_x, steps_y = numpy.array(DIRECTION_STEPS).T
+    dodges = dodge_table()
+    x, y, heading = batch.x.copy(), batch.y.copy(), batch.heading.copy()
+    phase = numpy.full(size, START_POSITION, dtype = numpy.int8)
+    axis = numpy.ones(size, dtype = numpy.int8)
+    depth = numpy.zeros(size, dtype = numpy.int8)                   # dodges in progress
+    side = numpy.zeros((size, DODGE_DEPTH), dtype = numpy.int8)
+    step = numpy.zeros((size, DODGE_DEPTH), dtype = numpy.int8)
+    results = numpy.full(size, RUNNING, dtype = numpy.int8)
+    commands = numpy.ones(size, dtype = numpy.int32)                # get_start_position: the first TURN_RIGHT
+    hits = numpy.zeros(size, dtype = numpy.int32)
+    command = numpy.full(size, RIGHT, dtype = numpy.int8)
+    active = batch.index
+
+    while len(active):
+        #? the robots carry out the commands
+        sent = command[active]
+        h = heading[active]
+        moving = active[sent == MOVE]
+        next_x, next_y = x[moving] + steps_x[heading[moving]], y[moving] + steps_y[heading[moving]]
+        free = ~batch.obstacle(next_x, next_y, moving)
+        moved = numpy.zeros(size, dtype = bool)
+        moved[moving[free]] = True
+        x[moving[free]], y[moving[free]] = next_x[free], next_y[free]
+        heading[active] = numpy.where(sent == LEFT, (h - 1) % 4, numpy.where(sent == RIGHT, (h + 1) % 4, h))
+
+        #? the server handles the replies -> next command of every robot
+        phases = phase[active]
+        starting = active[phases == START_POSITION]
+        searching = active[phases == START_DIRECTION]
+        navigating = active[phases == NAVIGATION]
+
+        #? the first TURN_RIGHT only tells the position: the robot can already be at [0, 0]
+        results[starting[(x[starting] == 0) & (y[starting] == 0)]] = COMPLETED
+        starting = starting[results[starting] == RUNNING]
+        phase[starting] = START_DIRECTION
+        command[starting] = MOVE
+
+        #? get_robot_direction: the first move that worked tells the direction, until then turn right and try again
+        found = moved[searching] & (command[searching] == MOVE)
+        waiting = searching[~found]
+        command[waiting] = numpy.where(command[waiting] == MOVE, RIGHT, MOVE)
+        found = searching[found]
+        phase[found] = NAVIGATION
+
+        #? robot_hit_obstacle: a move that didn't work starts a dodge (planner: on the side towards 0, or the same side)
+        hit = navigating[(command[navigating] == MOVE) & ~moved[navigating]]
+        hits[hit] += 1
+        if navigation == "classic":
+            new_side = numpy.zeros(len(hit), dtype = numpy.int8)
+        else:
+            right = (heading[hit] + 1) % 4
+            towards_zero = (numpy.abs(x[hit] + steps_x[right]) + numpy.abs(y[hit] + steps_y[right])
+                            <= numpy.abs(x[hit]) + numpy.abs(y[hit]))
+            new_side = numpy.where(depth[hit] > 0, side[hit, numpy.maximum(depth[hit] - 1, 0)], numpy.where(towards_zero, 0, 1))
+        deep = depth[hit] >= DODGE_DEPTH
+        results[hit[deep]] = LOOPING
+        hit, new_side = hit[~deep], new_side[~deep]
+        side[hit, depth[hit]] = new_side
+        step[hit, depth[hit]] = 0
+        depth[hit] += 1
+        navigating = numpy.concatenate((navigating[results[navigating] == RUNNING], found))
+
+        #? robot_dodge: finished dodges (or crossed axes after ROBOT_DODGE_AXIS_CHECK) are dropped, nested ones too
+        while True:
+            dodging = navigating[depth[navigating] > 0]
+            top = depth[dodging] - 1
+            current = step[dodging, top]
+            done = (current == dodges.shape[1]) | ((current == ROBOT_DODGE_AXIS_CHECK) & ((x[dodging] == 0) | (y[dodging] == 0)))
+            if not done.any():
+                break
+            depth[dodging[done]] -= 1
+        dodging = navigating[depth[navigating] > 0]
+        top = depth[dodging] - 1
+        command[dodging] = dodges[side[dodging, top], step[dodging, top]]
+        step[dodging, top] += 1
+
+        driving = navigating[depth[navigating] == 0]
+        goal = driving[(x[driving] == 0) & (y[driving] == 0)]
+        results[goal] = COMPLETED
+        driving = driving[(x[driving] != 0) | (y[driving] != 0)]
+        if navigation == "classic":
+            driving_axis = axis[driving]
+            command[driving] = classic_commands(x[driving], y[driving], heading[driving], driving_axis)
+            axis[driving] = driving_axis
+        else:
+            command[driving] = planner_commands(x[driving], y[driving], heading[driving])
+
+        #? every robot still running got a move/turn command
+        active = active[results[active] == RUNNING]
+        commands[active] += 1
+        results[active[commands[active] > max_commands]] = LOOPING
+        active = active[results[active] == RUNNING]
+    return results, commands, hits
+
+
+def percentile(values, percent: float):
+    return float(numpy.percentile(values, percent)) if len(values) else 0.0
+
+
+def report(navigation: str, results, commands, hits, elapsed: float):
+    completed = results == COMPLETED
+    print(f"{navigation}: {len(results):,} scenarios in {elapsed:.2f} s -> {len(results) / elapsed:,.0f} scenarios/s")
+    print("  commands per completed session: mean {:.2f}, ".format(commands[completed].mean() if completed.any() else 0)
+          + ", ".join(f"p{p} {percentile(commands[completed], p):.0f}" for p in PERCENTILES)
+          + f", max {commands[completed].max() if completed.any() else 0}")
+    print("  dodges per completed session:   mean {:.2f}, ".format(hits[completed].mean() if completed.any() else 0)
+          + ", ".join(f"p{p} {percentile(hits[completed], p):.0f}" for p in PERCENTILES)
+          + f", max {hits[completed].max() if completed.any() else 0}")
+    for result in (COMPLETED, LOOPING):
+        count = int((results == result).sum())
+        print(f"  {RESULT_NAMES[result]:<10} {count:10,} {count / len(results):8.3%}")
+    histogram = numpy.bincount(numpy.minimum(hits[completed], 9), minlength = 10)
+    print("  completed sessions by dodges: " + "  ".join(f"{dodges}{'+' if dodges == 9 else ''}: {count / max(completed.sum(), 1):.1%}"
+                                                        for dodges, count in enumerate(histogram) if count))
+
+
+#? the first robots of the first batch once more through robot_session -> the simulation has to send the same commands
+def verify(batch: robot_batch, navigation: str, results, commands, count: int):
+    config = server_config(navigation)
+    differences = 0
+    for robot in range(min(count, len(batch.index))):
+        sent = run_session(batch.virtual_robot(robot), config, 0.0)
+        simulated = int(commands[robot]) if results[robot] == COMPLETED else -1
+        if sent != simulated:
+            differences += 1
+            if differences <= 5:
+                print(f"  robot {robot}: robot_session {sent}, simulation {simulated} commands")
+    print(f"  verified {min(count, len(batch.index))} scenarios against robot_session: {differences} different")
+    return differences
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "vectorized navigation simulator")
+    parser.add_argument("--scenarios", type = int, default = 1000000)
+    parser.add_argument("--grid", type = int, default = 10, help = "start and obstacles are in [-grid, grid]^2")
+    parser.add_argument("--obstacles", type = int, default = 20)
+    parser.add_argument("--navigation", nargs = "+", choices = SIM_NAVIGATION_MODES, default = list(SIM_NAVIGATION_MODES))
+    parser.add_argument("--batch", type = int, default = BATCH_SIZE, help = "robots simulated at once")
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--verify", type = int, default = 0, help = "check the first N scenarios against robot_session")
+    args = parser.parse_args(argv)
+    if numpy is None:
+        raise SystemExit("sim_navigation.py needs NumPy (pip install numpy)")
+
+    for navigation in args.navigation:
+        rng = numpy.random.default_rng(args.seed)                   #? every strategy gets the same scenarios
+        outcomes = []
+        started = time.perf_counter()
+        for start in range(0, args.scenarios, args.batch):
+            batch = robot_batch(rng, min(args.batch, args.scenarios - start), args.grid, args.obstacles)
+            outcome = simulate(batch, navigation)
+            outcomes.append(outcome)
+            if start == 0 and args.verify:
+                verify(batch, navigation, outcome[0], outcome[1], args.verify)
+        elapsed = time.perf_counter() - started
+        report(navigation, *(numpy.concatenate(values) for values in zip(*outcomes)), elapsed)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,484 +1,2245 @@
-import socket
-import threading
-
-#? ====================================================================------ MAIN ------===============================================================================
-def main():
-    # !Constants
-
-    #? Server constants ----------------------------------------------------- 
-    PORT = 3999
-    HOST = socket.gethostbyname(socket.gethostname())
-    ADDRESS = (HOST, PORT)
-
-    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server.bind(ADDRESS)
-    server.listen(20)    #* listen to max 20 clients
-
-    FORMAT = "utf-8"
-    SUFFIX = b'\x07\x08'
-
-    # timeouts (s)
-    TIMEOUT = 1
-    TIMEOUT_RECHARGING = 5
-    #? Server constants ----------------------------------------------------- 
-
-    #* Key ID pairs; FORMAT =  KEY_ID : (SERVER_KEY, CLIENT_KEY)
-    SERVER_CLIENT_KEYS = {
-        0: (23019, 32037),
-        1: (32037, 29295),
-        2: (18789, 13603),
-        3: (16443, 29533),
-        4: (18189, 21952)
-    }
-    # Map for server messages and associated commands
-    SERVER_MESSAGES = {
-        # SERVER_COFIRMATION                IMPLEMENT ELSEWHERE IN THE CODE
-        "SERVER_KEY_REQUEST":               b"107 KEY REQUEST" + SUFFIX,
-        "SERVER_OK":                        b"200 OK" + SUFFIX,
-        "SERVER_MOVE":                      b"102 MOVE" + SUFFIX,
-        "SERVER_TURN_LEFT":                 b"103 TURN LEFT" + SUFFIX,
-        "SERVER_TURN_RIGHT":                b"104 TURN RIGHT" + SUFFIX,
-        "SERVER_PICK_UP":                   b"105 GET MESSAGE" + SUFFIX,
-        "SERVER_LOGOUT":                    b"106 LOGOUT" + SUFFIX,
-        "SERVER_LOGIN_FAILED":              b"300 LOGIN FAILED" + SUFFIX,
-        "SERVER_SYNTAX_ERROR":              b"301 SYNTAX ERROR" + SUFFIX,
-        "SERVER_LOGIC_ERROR":               b"302 LOGIC ERROR" + SUFFIX,
-        "SERVER_KEY_OUT_OF_RANGE_ERROR":    b"303 KEY OUT OF RANGE" + SUFFIX
-    }
-    CLIENT_MESSAGES_MAX_LEN = {
-        "CLIENT_USERNAME":      20,
-        "CLIENT_KEY_ID":        5,
-        "CLIENT_CONFIRMATION":  7,
-        "CLIENT_OK":            12,
-        "CLIENT_RECHARGING":    12,
-        "CLIENT_FULL_POWER":    12,
-        "CLIENT_MESSAGE":       100
-    }
-    CLIENT_RECHARGING_MESSAGES = {
-        "CLIENT_RECHARGING": b"RECHARGING" + SUFFIX,
-        "CLIENT_FULL_POWER": b"FULL POWER" + SUFFIX
-    }
-    DIRECTIONS_TURN_RIGHT = {
-        "LEFT":     "UP",
-        "RIGHT":    "DOWN",
-        "UP":       "RIGHT",
-        "DOWN":     "LEFT",
-        "NONE":     "NONE"
-    }
-    DIRECTIONS_TURN_LEFT = {
-        "UP":       "LEFT",
-        "LEFT":     "DOWN",
-        "DOWN":     "RIGHT",
-        "RIGHT":    "UP",
-        "NONE":     "NONE"
-    }
-
-    #|=================================================================================================================================================================
-
-    #! Custom exceptions
-    class SERVER_SYNTAX_ERROR(Exception):
-        def __init__(self, message):
-            self.message = message
-
-
-    class SERVER_KEY_OUT_OF_RANGE_ERROR(Exception):
-        def __init__(self, message):
-            self.message = message
-
-
-    class SERVER_LOGIN_FAILED(Exception):
-        def __init__(self, message):
-            self.message = message
-
-
-    #? cann happen only while clients robot is recharging  
-    class SERVER_LOGIC_ERROR(Exception):
-        def __init__(self, message):
-            self.message = message
-
-    #|================================================================================================================================================================
-    
-    #! Classes and structures
-    
-    class client_robot:
-        def __init__(self, conn):
-            self.conn = conn
-            self.connected: bool = True
-            self.username: str = ""
-            self.buffer: bytes = b''
-            self.recharging: bool = False
-            self.direction: str = "NONE"
-            self.position: tuple[int, int] = (0, 0)         # (x, y) coordinates
-            self.old_position: tuple[int, int] = (0, 0)     # (x, y) coordinates
-
-    #|=================================================================================================================================================================
-    
-    #! Functions
-        #*==========================================---- ↓ GENERAL FUNCTIONS ↓ ----=============================================================
-    
-    def get_message(robot: client_robot, msg_max_len: str, TIMEOUT: int = TIMEOUT):
-        msg = b''
-        max_message_len = max(CLIENT_MESSAGES_MAX_LEN[msg_max_len], CLIENT_MESSAGES_MAX_LEN["CLIENT_RECHARGING"])
-        # We are receiving data from the client until we receive a full message
-        while True:
-            # If there is nothing in the buffer, we wait for a message
-            if len(robot.buffer) == 0:
-                try:
-                    robot.conn.settimeout(TIMEOUT)
-                    robot.buffer += robot.conn.recv(1024)
-                except socket.timeout:
-                    close_client(robot.conn)
-                else:
-                    robot.conn.settimeout(None)                    
-            # If there is at least one byte in the buffer we gradually put it together into a message
-            # if we put together a whole message or if we reach max_message_len then we break the loop
-            else:
-                msg += robot.buffer[:1]
-                robot.buffer = robot.buffer[1:]
-                if len(msg) == max_message_len:
-                    print(msg)
-                    check_suffix(msg)
-                    break
-                if msg[-2:] == SUFFIX:
-                    break
-        
-        if msg != CLIENT_RECHARGING_MESSAGES["CLIENT_RECHARGING"]:
-            if msg == CLIENT_RECHARGING_MESSAGES["CLIENT_FULL_POWER"] and robot.recharging == False:
-                raise SERVER_LOGIC_ERROR(SERVER_MESSAGES["SERVER_LOGIC_ERROR"])       
-            else:
-                return msg
-        else:
-            robot_recharging(robot)
-            return get_message(robot, msg_max_len)
-
-
-        #*========================================---- ↓ AUTHENTICATE CLIENT ↓ ----=====================================================
-
-    
-    def authenticate_client(robot: client_robot):
-        
-        #~ --- GET CLIENT'S USERNAME ---
-        print("[GETTING USERNAME]")                                 #~ debug print
-        print(f"Starting username validation...")                   #~ debug print
-        client_username = get_message(robot, "CLIENT_USERNAME")
-
-        #? if the client_username is valid, set it to the robot's username
-        robot.username = client_username[:-2].decode(FORMAT)
-        robot.username = robot.username.strip()
-
-        #? check if the robot sent a recharge request 
-        check_recharge(robot)
-
-        #~ --- GET CLIENT'S KEY ID ---
-        #? if the client_username is valid, send him a key request
-        robot.conn.send(SERVER_MESSAGES["SERVER_KEY_REQUEST"])
-        client_KEY_ID = get_message(robot, "CLIENT_KEY_ID")                                             
-
-        check_key_ID(client_KEY_ID)
-
-        server_key, client_key = SERVER_CLIENT_KEYS[int(client_KEY_ID[:-2].decode(FORMAT))]
-        server_confirmation_key, hash_value = calculate_confirmation_key(robot.username, server_key)        
-
-        #? send SERVER_CONFIRMATION (= calculated server_confirmation_key ) to the client
-        robot.conn.send( str(server_confirmation_key).encode(FORMAT) + SUFFIX)
-
-        #~ --- GET CLIENT'S CONFIRMATION KEY ---
-        client_confirmation_key = get_message(robot, "CLIENT_CONFIRMATION")
-        
-        check_client_confirmation_key(client_confirmation_key, client_key, hash_value)
-
-        #? if the client_confirmation_key is correct, send SERVER_OK to the client
-        robot.conn.send(SERVER_MESSAGES["SERVER_OK"])
-            
-    
-    def check_suffix(message: bytes):
-        if message[-2:] != SUFFIX:
-            raise SERVER_SYNTAX_ERROR(SERVER_MESSAGES["SERVER_SYNTAX_ERROR"])
-
-
-    def check_client_confirmation_key(message: bytes, client_key: int, hash_value: int):
-        client_confirmation_key = message[:-2].decode(FORMAT)
-        if not client_confirmation_key.isnumeric() or len(message) > CLIENT_MESSAGES_MAX_LEN["CLIENT_CONFIRMATION"]:
-            raise SERVER_SYNTAX_ERROR(SERVER_MESSAGES["SERVER_SYNTAX_ERROR"])
-        
-        correct_client_key_value = (hash_value + client_key) % 65536
-
-        if int(client_confirmation_key) != correct_client_key_value:
-            raise SERVER_LOGIN_FAILED(SERVER_MESSAGES["SERVER_LOGIN_FAILED"])
-
-
-    def calculate_confirmation_key(username: str, server_key: int):
-        # both of the messages suffix was already checked
-        print(f"[CLIENTS USERNAME]: {username}")                #~ debug print
-
-        ascii_sum = 0
-        for char in username:
-            ascii_sum += ord(char)
-
-        hash_value = (ascii_sum * 1000) % 65536
-        print(f"[hash_value]: {hash_value}")                    #~ debug print
-
-        calculated_key = (hash_value + server_key) % 65536 
-
-        print(f"calculated_key = {calculated_key}")             #~ debug print
-        return calculated_key, hash_value                       
-
-
-    #? check if the key is ok
-    def check_key_ID(message: bytes):
-        key_ID = message[:-2].decode(FORMAT)
-        if not key_ID.isnumeric():
-            raise SERVER_SYNTAX_ERROR(SERVER_MESSAGES["SERVER_SYNTAX_ERROR"])
-        key_ID = int(key_ID)
-        if key_ID < 0 or key_ID > 4:
-            raise SERVER_KEY_OUT_OF_RANGE_ERROR(SERVER_MESSAGES["SERVER_KEY_OUT_OF_RANGE_ERROR"])    
-    
-
-        #*========================================---- ↓ ROBOT NAVIGATION FUNCTIONS ↓ ----=====================================================
-    
-    def navigate_robot(robot: client_robot):                                                 
-        print(f"STARTING TO NAVIGATE ROBOT!")      #~ debug print
-        get_start_position(robot)
-
-        while robot.position != (0,0):
-            #? firstly we get the robot to the position y = 0 
-            # we align robot so that he is facing towards the y axis        
-            align_robot(robot, 1)
-            while robot.position[1] != 0:
-                robot.conn.send(SERVER_MESSAGES["SERVER_MOVE"])
-                get_coords_from_message(robot)
-
-            #? now the robot is on position y = 0 so we need him to get to the position x = 0 
-            # we align robot so that he is facing towards the x axis
-            align_robot(robot, 0)
-            while robot.position[0] != 0:
-                robot.conn.send(SERVER_MESSAGES["SERVER_MOVE"])
-                get_coords_from_message(robot)            
-
-        # robot is now in the final position -> we pick up the message
-        robot.conn.send(SERVER_MESSAGES["SERVER_PICK_UP"])
-        msg = get_message(robot, "CLIENT_MESSAGE")
-
-
-    def align_robot(robot: client_robot, axis: int):   #? axis = 0 means X ...
-        if axis == 0:
-            if robot.position[0] < 0:
-                while robot.direction != "RIGHT":
-                    align_turn_robot(robot)            
-            elif robot.position[0] > 0:
-                while robot.direction != "LEFT":
-                    align_turn_robot(robot)
-        elif axis == 1:
-            if robot.position[1] < 0:
-                while robot.direction != "UP":
-                    align_turn_robot(robot)
-            elif robot.position[1] > 0:
-                while robot.direction != "DOWN":
-                    align_turn_robot(robot)
-        
-                    
-
-    def align_turn_robot(robot: client_robot):
-        robot.conn.send(SERVER_MESSAGES["SERVER_TURN_RIGHT"])
-        get_coords_from_message(robot, 2)
-
-
-    def get_start_position(robot: client_robot):
-        print(f"GETTING STARTING POSITION...")                  #~ debug print
-        #? first we need to get the coordinates of the robot
-        robot.conn.send(SERVER_MESSAGES["SERVER_TURN_RIGHT"])
-        get_coords_from_message(robot, 1)
-
-        #? if the robot has spawned in the final position [0, 0] we dont't need to continue
-        if robot.position == (0, 0):
-            return None
-
-        #? otherwise we have to get the direction the robot is facing
-        robot.conn.send(SERVER_MESSAGES["SERVER_MOVE"])
-        get_coords_from_message(robot)
-
-        #? if the robot is stuck right after he spawn, 
-        #? we try to move the robot until we have his position and direction
-        while robot.direction == "NONE":
-            robot.conn.send(SERVER_MESSAGES["SERVER_TURN_RIGHT"])
-            get_coords_from_message(robot, 2)
-            robot.conn.send(SERVER_MESSAGES["SERVER_MOVE"])
-            get_coords_from_message(robot)
-        
-
-    #? Get the new robot coordinates and direction from the message, set the robot's position and and old_position
-    def get_coords_from_message(robot: client_robot, turn: int = 0):    #? turn = 0 = robot moved 
-        robot.old_position = robot.position                             #? turn = 1 = robot turned left
-                                                                        #? turn = 2 = robot turned right
-        coords = get_message(robot, "CLIENT_OK")
-
-        coords = coords[:-2].decode(FORMAT)
-
-        if ( len(coords.split()) != 3 ) or ( len(coords) != len(coords.rstrip()) ):
-            raise SERVER_SYNTAX_ERROR(SERVER_MESSAGES["SERVER_SYNTAX_ERROR"])
-
-        # Split the message into x and y coordinates
-        x, y = coords.split()[1:]
-        
-        if "." in x or "." in y:
-            raise SERVER_SYNTAX_ERROR(SERVER_MESSAGES["SERVER_SYNTAX_ERROR"])
-
-        # Convert the coordinates to integers and update the robot's position
-        robot.position = (int(x), int(y))
-
-        #? Do NOT try to dodge an obstacle if:
-        #?  1) we are only getting the starting position
-        #?  2) the robot hits an obstacle right after he spawns
-        #?  3) the robot only turned right/left but didn't actually move
-        if (robot.position == robot.old_position) and (turn == 0) and (robot.direction != "NONE"):
-            #? robot hit an obstacle
-            robot_dodge(robot)
-
-        if turn == 0:
-            get_robot_direction(robot)
-        elif turn == 1:
-            robot.direction = DIRECTIONS_TURN_LEFT[robot.direction]
-        elif turn == 2:
-            robot.direction = DIRECTIONS_TURN_RIGHT[robot.direction]
-        
-        print(f"NEW POSITION: {robot.position}")                #~ debug print
-        print(f"NEW DIRECTION: {robot.direction}")              #~ debug print
-        
-
-    def get_robot_direction(robot: client_robot):
-        dx = robot.position[0] - robot.old_position[0]
-        dy = robot.position[1] - robot.old_position[1]
-
-        if dx > 0:
-            robot.direction = "RIGHT"
-        elif dx < 0:
-            robot.direction = "LEFT"
-        elif dy > 0:
-            robot.direction = "UP"
-        elif dy < 0:
-            robot.direction = "DOWN"
-
-
-    def robot_dodge(robot: client_robot):
-        robot.conn.send(SERVER_MESSAGES["SERVER_TURN_RIGHT"])
-        get_coords_from_message(robot, 2)
-        #
-        robot.conn.send(SERVER_MESSAGES["SERVER_MOVE"])
-        get_coords_from_message(robot)
-        #
-        robot.conn.send(SERVER_MESSAGES["SERVER_TURN_LEFT"])
-        get_coords_from_message(robot, 1)
-        #
-        robot.conn.send(SERVER_MESSAGES["SERVER_MOVE"])
-        get_coords_from_message(robot)
-        if robot.position[0] == 0 or robot.position[1] == 0:    #? if the robot crosses an axis while dodging an obstacle we can stop dodging
-            return None
-        #
-        robot.conn.send(SERVER_MESSAGES["SERVER_MOVE"])
-        get_coords_from_message(robot)
-        #
-        robot.conn.send(SERVER_MESSAGES["SERVER_TURN_LEFT"])
-        get_coords_from_message(robot, 1)
-        #
-        robot.conn.send(SERVER_MESSAGES["SERVER_MOVE"])
-        get_coords_from_message(robot)
-        #
-        robot.conn.send(SERVER_MESSAGES["SERVER_TURN_RIGHT"])
-        get_coords_from_message(robot, 2)
-
-
-         #*==========================================---- ↓ ROBOT  RECHARGING ↓ ----=============================================================
-
-    def robot_recharging(robot: client_robot):
-        robot.conn.settimeout(TIMEOUT_RECHARGING)
-        robot.recharging = True
-        message = get_message(robot, "CLIENT_FULL_POWER", TIMEOUT_RECHARGING)
-        if message != CLIENT_RECHARGING_MESSAGES["CLIENT_FULL_POWER"]:
-            raise SERVER_LOGIC_ERROR(SERVER_MESSAGES["SERVER_LOGIC_ERROR"])
-        robot.recharging = False
-        robot.conn.settimeout(None)
-
-    
-    def check_recharge(robot: client_robot):                    
-        print("ROBOT BUFFER IS CURRENTLY THIS:")                #~ debug print
-        print(robot.buffer)                                     #~ debug print
-        if SUFFIX in robot.buffer:
-            index = robot.buffer.index(SUFFIX) + 2
-            msg = robot.buffer[:index]
-            if msg != CLIENT_RECHARGING_MESSAGES["CLIENT_RECHARGING"]:
-                if msg == CLIENT_RECHARGING_MESSAGES["CLIENT_FULL_POWER"] and robot.recharging == False:
-                    raise SERVER_LOGIC_ERROR(SERVER_MESSAGES["SERVER_LOGIC_ERROR"])       
-            else:
-                print("[STARTING ROBOT RECHARGING]")
-                robot.buffer = robot.buffer[index:]
-                robot_recharging(robot)
-                
-
-    #|=================================================================================================================================================================
-    
-    #! CLIENTS HANDLING FUNCTIONS
-
-    def close_client(conn):
-        conn.close()
-
-
-    def comm_failure(robot, error_type: str):
-        print(error_type)
-        robot.conn.send(SERVER_MESSAGES[error_type])
-        close_client(robot.conn)
-
-
-    # Handle individual clients separately
-    # Running for each client individually
-    def handle_client(conn, addr):                              #TODO - delete addr from arguments
-        print(f"[NEW CONNECTION] {addr} connected.")            #~ debug print
-        robot = client_robot(conn)
-        
-        #~ --- CLIENT AUTHENTICATION ---
-        try:
-            authenticate_client(robot)
-        except SERVER_SYNTAX_ERROR:                             #? client's key ID or confirmation key is invalid
-            comm_failure(robot, "SERVER_SYNTAX_ERROR")
-        except SERVER_KEY_OUT_OF_RANGE_ERROR:
-            comm_failure(robot, "SERVER_KEY_OUT_OF_RANGE_ERROR")
-        except SERVER_LOGIN_FAILED:
-            comm_failure(robot, "SERVER_LOGIN_FAILED")
-
-        print(f"[{addr}] AUTHENTICATION IS OKEY!")              #~ debug print
-        
-        #~ --- CLIENT NAVIGATION ---
-        try:
-            navigate_robot(robot)
-        except SERVER_SYNTAX_ERROR:                             #? client's key ID or confirmation key is not a num
-            comm_failure(robot, "SERVER_SYNTAX_ERROR")
-        except SERVER_LOGIC_ERROR:
-            comm_failure(robot, "SERVER_LOGIC_ERROR")
-
-        #~ --- LOGOUT THE CLIENT ---
-        #? if the navigation was successful, send SERVER_LOGOUT to the client
-        conn.send(SERVER_MESSAGES["SERVER_LOGOUT"])
-
-        #? if the robot picked up the message successfully, we close the connection
-        print(f"{addr} diconnected.")                           #~ debug print
-        close_client(robot.conn)
-
-
-    #? Handle new connections and distribute them between clients 
-    def start():
-        server.listen()
-        print(f"[LISTENING] Server is listening on {HOST}")
-        while True:
-            conn, addr = server.accept()
-            thread = threading.Thread(target = handle_client, args=(conn, addr))   #? create an individual thread for each client
-            thread.start()
-            print(f"[ACTIVE CONNECTIONS] {threading.activeCount() - 1}")    # ~debug print
-
-
-    #! ########################---- START THE SERVER ----################################
-    print(f"[STARTING] server is starting...")                              # ~debug print
-    start()
-    
-#|=================================================================================================================================================================
-
-if __name__ == '__main__':
-    main()
\ No newline at end of file
+import socket
+import errno
+import threading
+import time
+import heapq
+import re
+import bisect
+import collections
+import functools
+import multiprocessing
+import signal
+import select
+import selectors
+import sys
+import queue
+import atexit
+import cProfile
+import pstats
+import io
+import mmap
+import os
+import random
+import struct
+import logging
+import logging.handlers
+import http.server
+import urllib.parse
+import asyncio
+import argparse
+
+#? ====================================================================------ CONSTANTS ------===============================================================================
+#? Server constants ----------------------------------------------------- 
+PORT = 3999
+BACKLOG = 128       #* connections the kernel keeps until we accept them (how many we serve is limited by MAX_SESSIONS)
+ASYNC_BACKLOG = 4096    #* asyncio mode is meant for whole fleets reconnecting at once
+MAX_SESSIONS = 512      #* threads mode: worker threads = sessions served at the same time
+ASYNC_MAX_SESSIONS = 20000
+QUEUE_SIZE = 1024       #* accepted connections waiting for a free session slot
+QUEUE_WAIT = 2          #* (s) a connection that waited longer than this is closed instead of served
+OVERLOAD_POLICIES = ("reject", "defer")     #* full queue -> close new connections / stop accepting until there's room
+DRAIN_TIMEOUT = 30      #* (s) how long SIGTERM/Ctrl+C waits for the sessions in progress
+STATS_INTERVAL = 10     #* (s) how often the supervisor of --workers prints the merged counters
+WORKER_EXIT_GRACE = 5   #* (s) workers still running this long after --drain-timeout are killed by the supervisor
+ACCEPT_RETRY_DELAY = 1  #* (s) threads mode: accept() ran out of file descriptors or memory -> no accepting for this long
+ACCEPT_RETRY_ERRORS = (errno.EMFILE, errno.ENFILE, errno.ENOBUFS, errno.ENOMEM)
+
+# logging
+LOG_FORMAT = "%(asctime)s %(levelname)-7s %(processName)s %(message)s"
+LOG_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR")
+LOG_QUEUE_SIZE = 10000      #* records waiting for the writer thread; when it is full new records are dropped
+LOG_MOVES_PER_SECOND = 20   #* NEW POSITION records per second (all sessions together), the rest is only counted
+
+FORMAT = "utf-8"
+SUFFIX = b'\x07\x08'
+
+# timeouts (s)
+TIMEOUT = 1
+TIMEOUT_RECHARGING = 5
+DEADLINE_RESOLUTION = 0.05  #* (s) tick of the deadline_wheel -> a session expires at most this late
+DEADLINE_WHEEL_SIZE = 256   #* ticks in one turn of the wheel (later deadlines wait for the next turn)
+
+# receive buffer (B)
+RECV_SIZE = 1024
+FRAME_BUFFER_SIZE = 128    #* a session's receive buffer starts with room for any single message (the longest is 100 B)
+FRAME_BUFFER_MAX = 4096    #* and grows up to this for robots that send more at once
+MIN_RECV_SPACE = 16        #* a frame_decoder with less free space at the end moves its unread bytes to the front first
+SESSION_BUDGET = 65536     #* bytes a robot may send in one session before it is disconnected (0 = no limit)
+#? Server constants ----------------------------------------------------- 
+
+AUTH_CACHE_SIZE = 4096      #* usernames whose login keys are kept (see login_keys)
+
+# profiling (see session_profiler)
+PROFILE_PATH = "robot_server-{pid}.prof"   #* pstats dump, {pid} -> every worker of --workers writes its own
+PROFILE_SAMPLE = 0.1        #* share of the sessions run under cProfile
+PROFILE_SECONDS = 30        #* profiling stops by itself after this (0 = only when toggled off)
+PROFILE_FUNCTIONS = ("get_message", "get_coords_from_message", "robot_dodge")     #* timed one by one
+PROFILE_TOP = 40            #* functions in the text report next to the dump
+
+# session recordings (see session_recorder)
+RECORDING_MAGIC = b"RBR1"
+RECORDING_SESSION = struct.Struct("<IdB")   #* bytes of the session after this header, wall-clock start, address length
+RECORDING_RECORD = struct.Struct("<IBH")    #* microseconds since the session start, RECORD_*, data length
+RECORDING_QUEUE_SIZE = 1000     #* sessions waiting for the recorder's writer thread; when it is full new ones are dropped
+RECORD_RECEIVED = 0     #* bytes of one recv from the robot
+RECORD_SENT = 1         #* everything the server sent after handling them
+RECORD_CLOSED = 2       #* the session ended (no data)
+
+#* Key ID pairs; FORMAT =  KEY_ID : (SERVER_KEY, CLIENT_KEY)
+SERVER_CLIENT_KEYS = {
+    0: (23019, 32037),
+    1: (32037, 29295),
+    2: (18789, 13603),
+    3: (16443, 29533),
+    4: (18189, 21952)
+}
+# Map for server messages and associated commands
+SERVER_MESSAGES = {
+    # SERVER_COFIRMATION                IMPLEMENT ELSEWHERE IN THE CODE
+    "SERVER_KEY_REQUEST":               b"107 KEY REQUEST" + SUFFIX,
+    "SERVER_OK":                        b"200 OK" + SUFFIX,
+    "SERVER_MOVE":                      b"102 MOVE" + SUFFIX,
+    "SERVER_TURN_LEFT":                 b"103 TURN LEFT" + SUFFIX,
+    "SERVER_TURN_RIGHT":                b"104 TURN RIGHT" + SUFFIX,
+    "SERVER_PICK_UP":                   b"105 GET MESSAGE" + SUFFIX,
+    "SERVER_LOGOUT":                    b"106 LOGOUT" + SUFFIX,
+    "SERVER_LOGIN_FAILED":              b"300 LOGIN FAILED" + SUFFIX,
+    "SERVER_SYNTAX_ERROR":              b"301 SYNTAX ERROR" + SUFFIX,
+    "SERVER_LOGIC_ERROR":               b"302 LOGIC ERROR" + SUFFIX,
+    "SERVER_KEY_OUT_OF_RANGE_ERROR":    b"303 KEY OUT OF RANGE" + SUFFIX
+}
+CLIENT_MESSAGES_MAX_LEN = {
+    "CLIENT_USERNAME":      20,
+    "CLIENT_KEY_ID":        5,
+    "CLIENT_CONFIRMATION":  7,
+    "CLIENT_OK":            12,
+    "CLIENT_RECHARGING":    12,
+    "CLIENT_FULL_POWER":    12,
+    "CLIENT_MESSAGE":       100
+}
+#* Syntax of the messages with a fixed format (without SUFFIX): (whole message, everything that can still become one).
+#* The second one is checked every time a part of a message arrives, so a frame that can't be valid anymore
+#* is answered with SERVER_SYNTAX_ERROR right away instead of after CLIENT_MESSAGES_MAX_LEN bytes.
+#* Digits are bounded by CLIENT_MESSAGES_MAX_LEN (the frames may be as long as CLIENT_RECHARGING), OK by the frame length.
+#* The other messages (username, secret message) can contain anything.
+KEY_ID_DIGITS = CLIENT_MESSAGES_MAX_LEN["CLIENT_KEY_ID"] - len(SUFFIX)
+CONFIRMATION_DIGITS = CLIENT_MESSAGES_MAX_LEN["CLIENT_CONFIRMATION"] - len(SUFFIX)
+CLIENT_MESSAGES_SYNTAX = {
+    "CLIENT_KEY_ID":        (re.compile(rb"\d{1,%d}" % KEY_ID_DIGITS), re.compile(rb"\d{0,%d}" % KEY_ID_DIGITS)),
+    "CLIENT_CONFIRMATION":  (re.compile(rb"\d{1,%d}" % CONFIRMATION_DIGITS), re.compile(rb"\d{0,%d}" % CONFIRMATION_DIGITS)),
+    "CLIENT_OK":            (re.compile(rb"OK -?\d+ -?\d+"), re.compile(rb"O?|OK(?: (?:-?\d*|-?\d+ -?\d*))?")),
+}
+CLIENT_RECHARGING_MESSAGES = {
+    "CLIENT_RECHARGING": b"RECHARGING" + SUFFIX,
+    "CLIENT_FULL_POWER": b"FULL POWER" + SUFFIX
+}
+RECHARGING_FRAMES = tuple(CLIENT_RECHARGING_MESSAGES.values())
+RECHARGING_MESSAGES = tuple(message[:-2] for message in RECHARGING_FRAMES)     # without SUFFIX
+#* Directions are small ints in clockwise order (turning right = +1), NONE until we know where the robot is facing
+DIRECTION_UP, DIRECTION_RIGHT, DIRECTION_DOWN, DIRECTION_LEFT, DIRECTION_NONE = 0, 1, 2, 3, -1
+DIRECTION_NAMES = ("UP", "RIGHT", "DOWN", "LEFT", "NONE")          # [DIRECTION_NONE] is the last one, for logging
+#* [direction] -> direction after the turn (NONE stays NONE)
+DIRECTIONS_TURN_RIGHT = (DIRECTION_RIGHT, DIRECTION_DOWN, DIRECTION_LEFT, DIRECTION_UP, DIRECTION_NONE)
+DIRECTIONS_TURN_LEFT = (DIRECTION_LEFT, DIRECTION_UP, DIRECTION_RIGHT, DIRECTION_DOWN, DIRECTION_NONE)
+#* [direction] -> step a move makes
+DIRECTION_STEPS = ((0, 1), (1, 0), (0, -1), (-1, 0))
+#* turn done by each command -> see get_coords_from_message
+COMMAND_TURNS = {
+    "SERVER_MOVE":          0,
+    "SERVER_TURN_LEFT":     1,
+    "SERVER_TURN_RIGHT":    2
+}
+#* Commands used to get around an obstacle
+ROBOT_DODGE_COMMANDS = (
+    "SERVER_TURN_RIGHT",
+    "SERVER_MOVE",
+    "SERVER_TURN_LEFT",
+    "SERVER_MOVE",
+    #? <- dodging stops here if the robot crossed an axis
+    "SERVER_MOVE",
+    "SERVER_TURN_LEFT",
+    "SERVER_MOVE",
+    "SERVER_TURN_RIGHT"
+)
+#* The same detour around the obstacle's other side
+ROBOT_DODGE_COMMANDS_MIRRORED = (
+    "SERVER_TURN_LEFT",
+    "SERVER_MOVE",
+    "SERVER_TURN_RIGHT",
+    "SERVER_MOVE",
+    "SERVER_MOVE",
+    "SERVER_TURN_RIGHT",
+    "SERVER_MOVE",
+    "SERVER_TURN_LEFT"
+)
+ROBOT_DODGE_AXIS_CHECK = 4
+
+#* Navigation strategies (--navigation)
+#*  classic -> y axis first, then x axis, always turning right, always dodging to the right
+#*  planner -> axis order and turn direction with the fewest commands, dodging towards the other axis
+#*  search  -> remembers the obstacles the robot hit and plans the shortest path around them
+NAVIGATION_MODES = ("classic", "planner", "search")
+SEARCH_MARGIN = 2       #* the search may go this many cells around the start, the goal and the known obstacles
+
+#* Server counters (server_counters)
+COUNTER_ACCEPTED    = 0
+COUNTER_COMPLETED   = 1     # robot picked up the message and was logged out
+COUNTER_FAILED      = 2     # error message sent, timeout, robot disconnected or walled in
+COUNTER_REJECTED    = 3     # closed without a session: the server was full or the connection waited too long
+COUNTER_NAMES = ("accepted", "completed", "failed", "rejected")
+
+#* Metrics (server_metrics): where the session time goes, every session is recorded once it ends
+METRICS_HOST = "127.0.0.1"     #* the /metrics endpoint is only meant for a local Prometheus/agent
+STAGE_AUTHENTICATION    = 0     # username, key ID and confirmation
+STAGE_START             = 1     # finding out the robot's position and direction
+STAGE_NAVIGATION        = 2
+STAGE_PICK_UP           = 3
+STAGE_RECHARGING        = 4     # from RECHARGING to FULL POWER (also counted in the stage the robot was in)
+STAGE_NAMES = ("authentication", "start", "navigation", "pick_up", "recharging")
+#* (s) upper bounds of the latency histogram buckets, the last bucket is +Inf
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+COMMANDS_BUCKETS = (5, 10, 15, 20, 25, 30, 40, 50, 75, 100, 200, 500)
+
+#* Session phases (client_robot.phase) and the message the client sends in each of them
+PHASE_USERNAME          = 0
+PHASE_KEY_ID            = 1
+PHASE_CONFIRMATION      = 2
+PHASE_START_POSITION    = 3     # waiting for the reply to the first turn, we don't know where the robot is
+PHASE_START_DIRECTION   = 4     # we know the position, moving the robot until we know his direction
+PHASE_NAVIGATION        = 5
+PHASE_PICK_UP           = 6
+PHASE_DONE              = 7
+PHASE_MESSAGES = {
+    PHASE_USERNAME:         "CLIENT_USERNAME",
+    PHASE_KEY_ID:           "CLIENT_KEY_ID",
+    PHASE_CONFIRMATION:     "CLIENT_CONFIRMATION",
+    PHASE_START_POSITION:   "CLIENT_OK",
+    PHASE_START_DIRECTION:  "CLIENT_OK",
+    PHASE_NAVIGATION:       "CLIENT_OK",
+    PHASE_PICK_UP:          "CLIENT_MESSAGE"
+}
+#* stage of each phase (PHASE_DONE has none)
+PHASE_STAGES = (STAGE_AUTHENTICATION, STAGE_AUTHENTICATION, STAGE_AUTHENTICATION, STAGE_START, STAGE_START,
+                STAGE_NAVIGATION, STAGE_PICK_UP)
+
+#|=================================================================================================================================================================
+
+#! Custom exceptions
+class SERVER_SYNTAX_ERROR(Exception):
+    def __init__(self, message):
+        self.message = message
+
+
+class SERVER_KEY_OUT_OF_RANGE_ERROR(Exception):
+    def __init__(self, message):
+        self.message = message
+
+
+class SERVER_LOGIN_FAILED(Exception):
+    def __init__(self, message):
+        self.message = message
+
+
+#? cann happen only while clients robot is recharging  
+class SERVER_LOGIC_ERROR(Exception):
+    def __init__(self, message):
+        self.message = message
+
+#|================================================================================================================================================================
+
+#! LOGGING
+#? Sessions only put records into a queue, a background thread formats and writes them. Per-message records
+#? (LOG_DEBUG) are checked by a plain flag before anything else, so with the default level they cost one if.
+log = logging.getLogger("robot_server")
+LOG_DEBUG = False       # log.isEnabledFor(logging.DEBUG), set by setup_logging
+
+
+#? Records are formatted by the writer thread (we don't need to pickle them, they stay in this process);
+#? a full queue drops the record instead of blocking the session
+class background_queue_handler(logging.handlers.QueueHandler):
+    def __init__(self, records: queue.Queue):
+        super().__init__(records)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord):
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+#? Token bucket for frequent records, it logs how many records it suppressed once it lets one through again
+class rate_limiter:
+    __slots__ = ("rate", "tokens", "last", "dropped")
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.last = time.monotonic()
+        self.dropped = 0
+
+    def allow(self):
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        if self.tokens < 1:
+            self.dropped += 1
+            return False
+        self.tokens -= 1
+        if self.dropped:
+            log.debug("(%d records suppressed by the rate limit)", self.dropped)
+            self.dropped = 0
+        return True
+
+MOVE_LOG_LIMITER = rate_limiter(LOG_MOVES_PER_SECOND)
+
+
+def setup_logging(level: str = "INFO", moves_per_second: float = LOG_MOVES_PER_SECOND):
+    global LOG_DEBUG
+    for handler in list(log.handlers):                         #? a forked worker replaces the supervisor's handler
+        log.removeHandler(handler)
+    records = queue.Queue(LOG_QUEUE_SIZE)
+    writer = logging.StreamHandler(sys.stdout)
+    writer.setFormatter(logging.Formatter(LOG_FORMAT))
+    listener = logging.handlers.QueueListener(records, writer)
+    listener.start()
+    atexit.register(listener.stop)
+
+    log.addHandler(background_queue_handler(records))
+    log.setLevel(level)
+    log.propagate = False
+    LOG_DEBUG = log.isEnabledFor(logging.DEBUG)
+    MOVE_LOG_LIMITER.rate = MOVE_LOG_LIMITER.tokens = moves_per_second
+    return listener
+
+#|================================================================================================================================================================
+
+#! Classes and structures
+
+#? Receive buffer that splits the incoming byte stream into SUFFIX-terminated frames.
+#? Bytes are received straight into a preallocated bytearray (recv_into) and every byte is scanned for SUFFIX only once;
+#? a frame is copied out of the buffer as a whole when it is complete.
+#? The buffer is reused for the whole session; it starts small and grows (up to max_capacity) only when a recv filled it up.
+class frame_decoder:
+    __slots__ = ("buffer", "view", "start", "end", "scan", "max_capacity", "filled", "received")
+
+    def __init__(self, capacity: int = FRAME_BUFFER_SIZE, max_capacity: int = FRAME_BUFFER_MAX):
+        self.buffer = bytearray(capacity)
+        self.view = memoryview(self.buffer)
+        self.start = 0          # first byte that is not part of an already returned frame
+        self.end = 0            # end of the received data
+        self.scan = 0           # bytes before this index were already searched for SUFFIX
+        self.max_capacity = max_capacity
+        self.filled = False     # the last recv filled the buffer -> the robot may have sent more
+        self.received = 0       # bytes received in the whole session (see SESSION_BUDGET)
+
+    def __len__(self):
+        return self.end - self.start
+
+    def free_space(self):
+        #? move the unread bytes to the front so there is room for the next recv
+        if self.start:
+            pending = self.end - self.start
+            self.buffer[:pending] = self.view[self.start:self.end]
+            self.scan -= self.start
+            self.start, self.end = 0, pending
+        return len(self.buffer) - self.end
+
+    def grow(self, needed: int):
+        #? new buffer with the unread bytes at the front (the old one can't be resized while self.view exists)
+        pending = self.end - self.start
+        capacity = min(max(2 * len(self.buffer), pending + needed), self.max_capacity)
+        buffer = bytearray(capacity)
+        buffer[:pending] = self.view[self.start:self.end]
+        self.scan -= self.start
+        self.buffer, self.view = buffer, memoryview(buffer)
+        self.start, self.end = 0, pending
+
+    def recv_from(self, conn, size: int = RECV_SIZE):
+        #? called once per recv, so robots that send byte by byte pay for every line here:
+        #? no min(), the buffer is only compacted or grown when it is needed, no slice of an empty buffer
+        end = self.end
+        free = len(self.buffer) - end
+        if free < size:
+            if self.filled and len(self.buffer) < self.max_capacity:
+                self.grow(size)
+                end, free = self.end, len(self.buffer) - self.end
+            elif self.start and free < MIN_RECV_SPACE:
+                free = self.free_space()
+                end = self.end
+            if free < size:
+                size = free
+        received = conn.recv_into(self.view[end:] if end else self.view, size)
+        self.end = end + received
+        self.received += received
+        self.filled = received == size
+        return received
+
+    def feed(self, data: bytes):
+        if len(data) > self.free_space():
+            if len(data) > self.max_capacity - (self.end - self.start):
+                raise SERVER_SYNTAX_ERROR(SERVER_MESSAGES["SERVER_SYNTAX_ERROR"])
+            self.grow(len(data))
+        self.buffer[self.end:self.end + len(data)] = data
+        self.end += len(data)
+        self.received += len(data)
+
+    def find_frame(self, max_len: int):
+        #? returns the end index of the next frame (including SUFFIX) or -1 if the frame is not complete yet
+        start = self.start
+        limit = self.end if self.end - start < max_len else start + max_len
+        index = self.buffer.find(SUFFIX, self.scan if self.scan > start else start, limit)
+        if index == -1:
+            #? the last byte can still be the first half of a SUFFIX split between two recv calls
+            self.scan = limit - 1 if limit > start else start
+            return -1
+        return index + 2
+
+    def next_frame(self, max_len: int):
+        #? returns a whole frame, None if more data is needed, raises SERVER_SYNTAX_ERROR if the frame can't fit into max_len
+        #? (find_frame inlined: this runs after every recv, byte by byte for fragmented robots)
+        start = self.start
+        limit = self.end if self.end - start < max_len else start + max_len
+        index = self.buffer.find(SUFFIX, self.scan if self.scan > start else start, limit)
+        if index == -1:
+            if self.end - start >= max_len:
+                raise SERVER_SYNTAX_ERROR(SERVER_MESSAGES["SERVER_SYNTAX_ERROR"])
+            self.scan = limit - 1 if limit > start else start
+            return None
+        end = index + 2
+        frame = bytes(self.view[start:end])
+        if end == self.end:
+            self.start = self.end = self.scan = 0               #? everything was read -> start from the front again
+        else:
+            self.start = self.scan = end
+        return frame
+
+    def pending(self):
+        #? the received part of the next (incomplete) frame
+        return bytes(self.view[self.start:self.end])
+
+    def peek_frame(self, max_len: int):
+        #? same as next_frame, but the frame stays in the buffer and an over-long frame is not an error here
+        end = self.find_frame(max_len)
+        if end == -1:
+            return None
+        return bytes(self.view[self.start:end])
+
+
+#? Output of one session: the frames queued in robot.outbox go out in one sendmsg (the pre-built SERVER_MESSAGES
+#? frames are not copied or joined) and a partial send keeps the unsent rest for the next flush, so a frame
+#? is never cut off. An error followed by closing the connection is one write as well.
+class frame_writer:
+    __slots__ = ("conn", "frames")
+
+    def __init__(self, conn, frames: list):
+        self.conn = conn
+        self.frames = frames            # robot.outbox, the session keeps appending to it
+
+    def flush(self):
+        frames = self.frames
+        while frames:
+            try:
+                if not SENDMSG:
+                    sent = self.conn.send(b''.join(frames))
+                else:
+                    sent = self.conn.sendmsg(frames if len(frames) <= SENDMSG_MAX_FRAMES else frames[:SENDMSG_MAX_FRAMES])
+            except BlockingIOError:                             #? non-blocking socket: wait until it takes more
+                select.select((), (self.conn,), ())
+                continue
+            self.advance(sent)
+
+    def advance(self, sent: int):
+        frames = self.frames
+        while sent:
+            size = len(frames[0])
+            if sent < size:
+                frames[0] = memoryview(frames[0])[sent:]
+                return None
+            sent -= size
+            del frames[0]
+        return None
+
+SENDMSG = hasattr(socket.socket, "sendmsg")     #? not on Windows
+SENDMSG_MAX_FRAMES = os.sysconf("SC_IOV_MAX") if SENDMSG else 0     #? more buffers in one sendmsg -> EMSGSIZE
+
+
+#? The same for event loops: the frames are handed to the asyncio transport (or StreamWriter) in one writelines,
+#? which never blocks - what the socket doesn't take stays in the transport's buffer, in order. Depending on the
+#? loop writelines is a gather write as well (uvloop, Python 3.12+) or joins the frames.
+class transport_writer(frame_writer):
+    __slots__ = ()
+
+    def flush(self):
+        if self.frames:
+            self.conn.writelines(self.frames)
+            self.frames.clear()
+
+
+#? Records of one sampled session, kept in memory until the session ends
+class session_recording:
+    __slots__ = ("started", "address", "data")
+
+    def __init__(self, now: float, address):
+        self.started = now
+        self.address: bytes = ("%s:%s" % address if isinstance(address, tuple) else str(address)).encode(FORMAT)[:255]
+        self.data = bytearray()
+
+    def add(self, kind: int, data, now: float):
+        self.data += RECORDING_RECORD.pack(int((now - self.started) * 1000000), kind, len(data))
+        self.data += data
+
+
+#? Appends a share (sample) of the sessions to a binary log for replay_sessions.py: RECORDING_MAGIC, then for every
+#? session RECORDING_SESSION + address + its records (RECORDING_RECORD + data). A session is written with one
+#? write() when it ends, so the workers of --workers can share the file (O_APPEND) and a session not sampled costs nothing.
+#? While the server runs (start_writer) the write() happens in a background thread, like the log records: a slow disk
+#? doesn't stall the event loop or a worker, a full queue drops the session instead.
+class session_recorder:
+    __slots__ = ("fd", "sample", "sessions", "writer", "dropped")
+
+    def __init__(self, path: str, sample: float = 1.0):
+        self.fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self.sample = sample
+        self.sessions = None                    # queue.Queue of finished sessions for the writer thread
+        self.writer = None
+        self.dropped = 0
+        if os.fstat(self.fd).st_size == 0:
+            os.write(self.fd, RECORDING_MAGIC)
+
+    #? in the process that serves (a thread doesn't survive the fork of --workers)
+    def start_writer(self):
+        self.sessions = queue.Queue(RECORDING_QUEUE_SIZE)
+        self.dropped = 0
+        self.writer = threading.Thread(target = self.write_sessions, args = (self.sessions,), daemon = True)
+        self.writer.start()
+
+    def write_sessions(self, sessions: queue.Queue):
+        while True:
+            data = sessions.get()
+            if data is None:
+                break
+            os.write(self.fd, data)
+        while not sessions.empty():                             #? put by sessions that saw the writer just before it stopped
+            os.write(self.fd, sessions.get_nowait())
+
+    #? writes everything that is queued; sessions ending later are written directly
+    def stop_writer(self):
+        writer, self.writer = self.writer, None
+        if writer is None:
+            return None
+        self.sessions.put(None)
+        writer.join()
+        if self.dropped:
+            log.warning("[RECORDING] %d sessions dropped, the disk didn't keep up", self.dropped)
+
+    #? None if the session isn't sampled
+    def start(self, now: float, address):
+        if self.sample < 1 and random.random() >= self.sample:
+            return None
+        return session_recording(now, address)
+
+    def write(self, recording: session_recording, now: float):
+        recording.add(RECORD_CLOSED, b'', now)
+        header = RECORDING_SESSION.pack(len(recording.address) + len(recording.data), time.time() - (now - recording.started),
+                                        len(recording.address))
+        if self.writer is None:
+            os.write(self.fd, header + recording.address + recording.data)
+            return None
+        try:
+            self.sessions.put_nowait(header + recording.address + recording.data)
+        except queue.Full:
+            self.dropped += 1
+
+
+#? Reads a session_recorder log without loading it: yields (wall-clock start, address, records) for every session,
+#? records = [(seconds since the start, RECORD_*, data), ...]
+def read_recording(path: str):
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ) as data:
+        if data[:len(RECORDING_MAGIC)] != RECORDING_MAGIC:
+            raise ValueError(f"{path} is not a session recording")
+        offset = len(RECORDING_MAGIC)
+        while offset + RECORDING_SESSION.size <= len(data):
+            length, started, address_length = RECORDING_SESSION.unpack_from(data, offset)
+            offset += RECORDING_SESSION.size
+            end = offset + length
+            if end > len(data):                                 #? cut off (the server was killed while writing)
+                return None
+            address = data[offset:offset + address_length].decode(FORMAT)
+            position = offset + address_length
+            records = []
+            while position < end:
+                microseconds, kind, size = RECORDING_RECORD.unpack_from(data, position)
+                position += RECORDING_RECORD.size
+                records.append((microseconds / 1000000, kind, data[position:position + size]))
+                position += size
+            offset = end
+            yield started, address, records
+
+
+#? Settings shared by all sessions of the server (filled in from the command line)
+class server_config:
+    __slots__ = ("navigation", "report_commands", "counters", "log_level", "log_moves", "metrics", "metrics_port",
+                 "backlog", "max_sessions", "queue_size", "queue_wait", "overload", "drain_timeout", "recorder", "session_budget",
+                 "profile_path", "profile_sample", "profile_seconds", "profile_functions")
+
+    def __init__(self, navigation: str = "planner", report_commands: bool = False,
+                 log_level: str = "INFO", log_moves: float = LOG_MOVES_PER_SECOND, metrics_port: int = 0,
+                 backlog: int = BACKLOG, max_sessions: int = MAX_SESSIONS, queue_size: int = QUEUE_SIZE, queue_wait: float = QUEUE_WAIT,
+                 overload: str = "reject", drain_timeout: float = DRAIN_TIMEOUT, recorder: session_recorder = None,
+                 session_budget: int = SESSION_BUDGET, profile_path: str = PROFILE_PATH, profile_sample: float = PROFILE_SAMPLE,
+                 profile_seconds: float = PROFILE_SECONDS, profile_functions: tuple = PROFILE_FUNCTIONS):
+        self.navigation: str = navigation               # one of NAVIGATION_MODES
+        self.report_commands: bool = report_commands    # log expected/sent commands of every finished session
+        self.counters = server_counters()
+        self.log_level: str = log_level                 # one of LOG_LEVELS
+        self.log_moves: float = log_moves               # NEW POSITION records per second
+        self.metrics = server_metrics()
+        self.metrics_port: int = metrics_port           # 0 = no /metrics endpoint
+        self.backlog: int = backlog                     # listen backlog (connections the kernel keeps before accept)
+        self.max_sessions: int = max_sessions           # sessions served at the same time
+        self.queue_size: int = queue_size               # connections waiting for a session slot
+        self.queue_wait: float = queue_wait             # (s) max. time a connection waits in the queue
+        self.overload: str = overload                   # one of OVERLOAD_POLICIES
+        self.drain_timeout: float = drain_timeout       # (s) max. time to finish the sessions when shutting down
+        self.recorder = recorder                        # None = sessions are not recorded
+        self.session_budget: int = session_budget       # bytes one robot may send, 0 = no limit
+        self.profile_path: str = profile_path           # defaults of session_profiler.start (SIGUSR1)
+        self.profile_sample: float = profile_sample
+        self.profile_seconds: float = profile_seconds
+        self.profile_functions: tuple = profile_functions
+
+
+#? Session counters of one server process. With --workers every worker writes into its own part
+#? of an array shared with the supervisor, which adds them up.
+class server_counters:
+    __slots__ = ("values", "offset", "lock")
+
+    def __init__(self, values = None, offset: int = 0):
+        self.values = values if values is not None else [0] * len(COUNTER_NAMES)
+        self.offset = offset
+        self.lock = threading.Lock()
+
+    def add(self, counter: int, value: int = 1):
+        with self.lock:
+            self.values[self.offset + counter] += value
+
+    def snapshot(self):
+        return list(self.values[self.offset:self.offset + len(COUNTER_NAMES)])
+
+
+#? Fixed buckets -> observing a value is one bisect and three additions
+class histogram:
+    __slots__ = ("bounds", "counts", "total", "count")
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)           # the last one is +Inf
+        self.total = 0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+    #? Prometheus text format, the buckets are cumulative
+    def expose(self, lines: list, name: str, labels: str = ""):
+        separator = "," if labels else ""
+        cumulative = 0
+        for bound, count in zip(self.bounds + ("+Inf",), self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels}{separator}le="{bound}"}} {cumulative}')
+        labels = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{labels} {self.total}")
+        lines.append(f"{name}_count{labels} {self.count}")
+
+
+#? Metrics of one server process. Sessions keep their own timings and hand them over once, when they end,
+#? so a session takes this lock twice in its lifetime.
+class server_metrics:
+    __slots__ = ("lock", "active", "parked", "errors", "recharges", "obstacle_hits", "commands", "durations", "stages")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active: int = 0
+        self.parked: int = 0                            # recharging sessions waiting without a worker
+        self.errors: dict[str, int] = {}                # failed sessions by robot.error
+        self.recharges: int = 0
+        self.obstacle_hits: int = 0
+        self.commands = histogram(COMMANDS_BUCKETS)     # move/turn commands per finished session
+        self.durations = histogram(LATENCY_BUCKETS)     # whole sessions
+        self.stages = [histogram(LATENCY_BUCKETS) for _ in STAGE_NAMES]
+
+    def open_session(self):
+        with self.lock:
+            self.active += 1
+
+    #? +1 when a recharging session is parked, -1 when it resumes
+    def park_session(self, change: int):
+        with self.lock:
+            self.parked += change
+
+    def close_session(self, session, now: float):
+        robot = session.robot
+        with self.lock:
+            self.active -= 1
+            if robot.error:
+                self.errors[robot.error] = self.errors.get(robot.error, 0) + 1
+            self.recharges += robot.recharges
+            self.obstacle_hits += robot.obstacle_hits
+            if robot.commands:
+                self.commands.observe(robot.commands)
+            self.durations.observe(now - session.started)
+            for stage, seconds in enumerate(session.timings):
+                if seconds:
+                    self.stages[stage].observe(seconds)
+
+    def render(self, counters: server_counters):
+        accepted, completed, failed, rejected = counters.snapshot()
+        lines = []
+        with self.lock:
+            lines.append("# TYPE robot_sessions_active gauge")
+            lines.append(f"robot_sessions_active {self.active}")
+            lines.append("# TYPE robot_sessions_parked gauge")
+            lines.append(f"robot_sessions_parked {self.parked}")
+            lines.append("# TYPE robot_sessions_accepted_total counter")
+            lines.append(f"robot_sessions_accepted_total {accepted}")
+            lines.append("# TYPE robot_sessions_completed_total counter")
+            lines.append(f"robot_sessions_completed_total {completed}")
+            lines.append("# TYPE robot_sessions_rejected_total counter")
+            lines.append(f"robot_sessions_rejected_total {rejected}")
+            lines.append("# TYPE robot_sessions_failed_total counter")
+            for error, count in sorted(self.errors.items()):
+                lines.append(f'robot_sessions_failed_total{{error="{error}"}} {count}')
+            auth_cache = login_keys.cache_info()
+            lines.append("# TYPE robot_auth_cache_hits_total counter")
+            lines.append(f"robot_auth_cache_hits_total {auth_cache.hits}")
+            lines.append("# TYPE robot_auth_cache_misses_total counter")
+            lines.append(f"robot_auth_cache_misses_total {auth_cache.misses}")
+            lines.append("# TYPE robot_auth_cache_entries gauge")
+            lines.append(f"robot_auth_cache_entries {auth_cache.currsize}")
+            lines.append("# TYPE robot_recharges_total counter")
+            lines.append(f"robot_recharges_total {self.recharges}")
+            lines.append("# TYPE robot_obstacle_hits_total counter")
+            lines.append(f"robot_obstacle_hits_total {self.obstacle_hits}")
+            lines.append("# TYPE robot_session_commands histogram")
+            self.commands.expose(lines, "robot_session_commands")
+            lines.append("# TYPE robot_session_seconds histogram")
+            self.durations.expose(lines, "robot_session_seconds")
+            lines.append("# TYPE robot_stage_seconds histogram")
+            for name, stage in zip(STAGE_NAMES, self.stages):
+                stage.expose(lines, "robot_stage_seconds", f'stage="{name}"')
+        return "\n".join(lines) + "\n"
+
+DEFAULT_CONFIG = server_config()
+
+
+#? Profiling switched on and off while the server runs (SIGUSR1 or POST /profile on the metrics port):
+#?  - a share (sample) of the sessions runs under its own cProfile, merged into one pstats.Stats when it ends
+#?    (threads: the whole run on a worker; asyncio: the session's receive_data calls, since sessions interleave on the loop),
+#?  - the functions listed are replaced in the module by timed wrappers (calls, total and max time).
+#? When it is off, the only cost is one check of self.active per session run - the functions are the original ones.
+#? Stopping (toggle, or after the given seconds) writes the stats to path and a readable report to path + ".txt".
+class session_profiler:
+    __slots__ = ("lock", "active", "generation", "sample", "path", "stats", "sessions", "timers", "originals")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active: bool = False
+        self.generation: int = 0                # profiles of an earlier run that end late are dropped
+        self.sample: float = 0.0
+        self.path: str = ""
+        self.stats = None                       # pstats.Stats of the profiled sessions
+        self.sessions: int = 0
+        self.timers: dict[str, list] = {}       # function name -> [calls, total ns, max ns]
+        self.originals: dict = {}
+
+    def start(self, path: str = PROFILE_PATH, sample: float = PROFILE_SAMPLE, seconds: float = PROFILE_SECONDS,
+              functions: tuple = PROFILE_FUNCTIONS):
+        module = globals()
+        functions = tuple(dict.fromkeys(functions))              #? a name twice would save its wrapper as the original
+        check_profile_settings(sample, seconds, functions)
+        with self.lock:
+            if self.active:
+                return False
+            self.generation += 1
+            self.sample, self.path = sample, path.format(pid = os.getpid())
+            self.stats, self.sessions, self.timers = None, 0, {}
+            for name in functions:
+                self.originals[name] = module[name]
+                self.timers[name] = [0, 0, 0]
+                module[name] = timed_function(module[name], self.timers[name], self.lock)
+            self.active = True
+        if seconds:
+            timer = threading.Timer(seconds, self.stop, args = (self.generation,))
+            timer.daemon = True
+            timer.start()
+        log.info("[PROFILING] started: %.0f %% of the sessions, %s, timing %s", sample * 100,
+                 f"for {seconds} s" if seconds else "until stopped", ", ".join(functions) or "no functions")
+        return True
+
+    #? returns the path of the dump, None if profiling wasn't running (or was restarted since generation)
+    def stop(self, generation: int = None):
+        with self.lock:
+            if not self.active or (generation is not None and generation != self.generation):
+                return None
+            self.active = False
+            globals().update(self.originals)
+            self.originals = {}
+            stats, sessions, timers, path = self.stats, self.sessions, self.timers, self.path
+        report = io.StringIO()
+        for name, (calls, total, longest) in timers.items():
+            line = f"{name}: {calls} calls, {total / 1e6:.1f} ms, {total / max(calls, 1) / 1e3:.2f} us per call, max {longest / 1e3:.1f} us"
+            log.info("[PROFILING] %s", line)
+            report.write(line + "\n")
+        if stats is not None:
+            stats.dump_stats(path)
+            stats.stream = report
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(PROFILE_TOP)
+        with open(path + ".txt", "w") as file:
+            file.write(f"{sessions} profiled sessions\n" + report.getvalue())
+        log.info("[PROFILING] stopped: %d profiled sessions -> %s", sessions, path)
+        return path
+
+    def toggle(self, config: server_config):
+        if self.stop() is None:
+            self.start(config.profile_path, config.profile_sample, config.profile_seconds, config.profile_functions)
+
+    #? (profile, generation) for a sampled session, None for the others; drawn once when the session starts,
+    #? the session keeps it until it ends and is then added once
+    def session(self):
+        if random.random() >= self.sample:
+            return None
+        return cProfile.Profile(), self.generation
+
+    def add(self, profile: cProfile.Profile, generation: int):
+        stats = pstats.Stats(profile)
+        with self.lock:
+            if not self.active or generation != self.generation:
+                return None
+            if self.stats is None:
+                self.stats = stats
+            else:
+                self.stats.add(stats)
+            self.sessions += 1
+
+    #? Profiles the session's next run on a worker (threads) or its next message (asyncio); returns the profile
+    #? to disable afterwards, None if the session isn't sampled
+    def enable(self, profiled: tuple):
+        if profiled is None:
+            return None
+        try:
+            profiled[0].enable()
+        except ValueError:                                      #? Python 3.12+: only one cProfile per process at a time
+            return None
+        return profiled[0]
+
+
+#? raises ValueError for settings session_profiler.start can't use (from the command line or /profile/start)
+def check_profile_settings(sample: float, seconds: float, functions: tuple):
+    if not 0 <= sample <= 1:
+        raise ValueError(f"sample {sample} is not between 0 and 1")
+    if not 0 <= seconds < float("inf"):
+        raise ValueError(f"seconds {seconds} is not a duration (0 = until stopped)")
+    unknown = [name for name in functions if not callable(globals().get(name))]
+    if unknown:
+        raise ValueError(f"unknown functions {unknown}")
+
+
+def timed_function(function, totals: list, lock: threading.Lock):
+    @functools.wraps(function)
+    def timed(*args):
+        started = time.perf_counter_ns()
+        try:
+            return function(*args)
+        finally:
+            elapsed = time.perf_counter_ns() - started
+            with lock:
+                totals[0] += 1
+                totals[1] += elapsed
+                if elapsed > totals[2]:
+                    totals[2] = elapsed
+    return timed
+
+PROFILER = session_profiler()
+
+
+#? Hashed timer wheel with the deadlines of all sessions of the server. Every session has one entry at the tick
+#? of its deadline; a later deadline (the robot sent something) is only checked when the entry comes due
+#? and then moved, so handling a message costs one comparison. Due sessions are expired in batches.
+class deadline_wheel:
+    __slots__ = ("resolution", "buckets", "tick", "lock")
+
+    def __init__(self, now: float, resolution: float = DEADLINE_RESOLUTION, size: int = DEADLINE_WHEEL_SIZE):
+        self.resolution = resolution
+        self.buckets: list[list] = [[] for _ in range(size)]    # [tick, session, handle] entries
+        self.tick: int = int(now / resolution)                  # first tick that wasn't expired yet
+        self.lock = threading.Lock()
+
+    #? handle is whatever the server needs to close the connection, expire() returns it
+    def schedule(self, session, handle):
+        tick = max(int(session.deadline / self.resolution), self.tick)
+        with self.lock:
+            session.timer = tick
+            self.buckets[tick % len(self.buckets)].append((tick, session, handle))
+
+    #? call after every event of the session: only a deadline earlier than its entry needs a new one
+    #? (FULL POWER after RECHARGING), the old entry is skipped when it comes due
+    def update(self, session, handle):
+        if session.deadline < session.timer * self.resolution:
+            self.schedule(session, handle)
+
+    def expire(self, now: float):
+        expired = []
+        last = int(now / self.resolution)                       #? ticks before this one have fully passed
+        size = len(self.buckets)
+        with self.lock:
+            while self.tick < last:
+                index = self.tick % size
+                bucket = self.buckets[index]
+                self.buckets[index] = []
+                for entry in bucket:
+                    tick, session, handle = entry
+                    if tick > self.tick:                        #? next turn of the wheel
+                        self.buckets[index].append(entry)
+                    elif session.closed or session.timer != tick:   #? finished or rescheduled earlier
+                        continue
+                    elif session.deadline <= now:
+                        expired.append(handle)
+                    else:                                       #? the robot sent something since -> move the entry
+                        session.timer = int(session.deadline / self.resolution)
+                        self.buckets[session.timer % size].append((session.timer, session, handle))
+                self.tick += 1
+        return expired
+
+
+#? State of one robot session. The session itself does no I/O (see robot_session below),
+#? so the same state machine is driven by the thread server, the asyncio server or a benchmark.
+class client_robot:
+    __slots__ = ("username", "frames", "outbox", "phase", "recharging", "held_back", "key_ID", "login_keys", "confirmation",
+                 "direction", "position", "old_position", "last_turn", "axis", "dodge", "commands",
+                 "navigation", "expected_commands", "obstacles", "path", "error", "address", "recharges", "obstacle_hits")
+
+    def __init__(self, navigation: str = "planner", report_commands: bool = False):
+        self.username: bytes = b""                      # as received (decoded only for the confirmation keys and logging)
+        self.frames = frame_decoder()
+        self.outbox: list[bytes] = []                   # messages waiting to be sent to the client
+        self.phase: int = PHASE_USERNAME
+        self.recharging: bool = False
+        self.held_back: bytes = b''                     # reply we send only after the robot stops recharging
+        self.key_ID: int = 0
+        self.login_keys: tuple = ()                     # login_keys(username)
+        self.confirmation: int = 0                      # CLIENT_CONFIRMATION we expect
+        self.direction: int = DIRECTION_NONE            # DIRECTION_* code
+        self.position: tuple[int, int] = (0, 0)         # (x, y) coordinates
+        self.old_position: tuple[int, int] = (0, 0)     # (x, y) coordinates
+        self.last_turn: int = 0                         # turn of the last command we sent -> see get_coords_from_message
+        self.axis: int = 1                              # axis we are currently navigating along (1 = y, 0 = x)
+        self.dodge: list[list] = []                     # [commands, next step] of every (nested) dodge in progress
+        self.commands: int = 0                          # number of move/turn commands sent
+        self.navigation: str = navigation               # one of NAVIGATION_MODES
+        #? commands we expect to send on a grid without obstacles, -1 until navigation starts; None = not counted
+        #? (a second simulation of the whole route, only --report-commands needs it)
+        self.expected_commands: int = -1 if report_commands else None
+        self.obstacles: set[int] = None                 # cells the robot hit (see cell_key), only in the search navigation
+        self.path: list[str] = None                     # planned commands (last one goes first), only in the search navigation
+        self.error: str = ""                            # why the session ended early (SERVER_MESSAGES key, "TIMEOUT", ...)
+        self.address = None                             # client's (host, port), only for logging
+        self.recharges: int = 0
+        self.obstacle_hits: int = 0
+
+    #? log context of the session, formatted only when a record is written
+    def __str__(self):
+        address = f"{self.address[0]}:{self.address[1]}" if self.address else "-"
+        return f"[{address} {self.username.decode(FORMAT, 'replace').strip() or '?'}]"
+
+#|=================================================================================================================================================================
+
+#! Functions
+    #*==========================================---- ↓ GENERAL FUNCTIONS ↓ ----=============================================================
+
+def send(robot: client_robot, message: bytes):
+    robot.outbox.append(message)
+
+
+def send_command(robot: client_robot, command: str):
+    send(robot, SERVER_MESSAGES[command])
+    robot.last_turn = COMMAND_TURNS.get(command, 0)
+    robot.commands += 1
+
+
+#? Take the next complete message out of the robot's buffer, None if it didn't arrive whole yet.
+#? Both the message and the part of the next one that already arrived are checked against CLIENT_MESSAGES_SYNTAX.
+#? (While recharging anything but FULL POWER is a logic error, so there is nothing to check.)
+def get_message(robot: client_robot):
+    msg_max_len = "CLIENT_FULL_POWER" if robot.recharging else PHASE_MESSAGES[robot.phase]
+    max_message_len = max(CLIENT_MESSAGES_MAX_LEN[msg_max_len], CLIENT_MESSAGES_MAX_LEN["CLIENT_RECHARGING"])
+    message = robot.frames.next_frame(max_message_len)
+    syntax = None if robot.recharging else CLIENT_MESSAGES_SYNTAX.get(msg_max_len)
+    if syntax is None:
+        return message
+    if message is None:
+        if robot.frames and not valid_message_start(robot.frames.pending(), syntax):
+            raise SERVER_SYNTAX_ERROR(SERVER_MESSAGES["SERVER_SYNTAX_ERROR"])
+    elif syntax[0].fullmatch(message, 0, len(message) - 2) is None and message not in RECHARGING_FRAMES:
+        raise SERVER_SYNTAX_ERROR(SERVER_MESSAGES["SERVER_SYNTAX_ERROR"])
+    return message
+
+
+#? Can the beginning of a message still become a valid message (or RECHARGING / FULL POWER)?
+def valid_message_start(data: bytes, syntax: tuple):
+    if data[-1:] == SUFFIX[:1]:                             #? first half of the SUFFIX -> the message before it has to be whole
+        data = data[:-1]
+        return syntax[0].fullmatch(data) is not None or data in RECHARGING_MESSAGES
+    return (syntax[1].fullmatch(data) is not None
+            or any(recharging_message.startswith(data) for recharging_message in RECHARGING_MESSAGES))
+
+
+        #*========================================---- ↓ AUTHENTICATE CLIENT ↓ ----=====================================================
+
+
+def authenticate_client(robot: client_robot, message: bytes):
+    if robot.phase == PHASE_USERNAME:
+        #~ --- GET CLIENT'S USERNAME ---
+        robot.username = message[:-2]
+        robot.login_keys = login_keys(robot.username)
+        if LOG_DEBUG:
+            log.debug("%s [CLIENTS USERNAME]", robot)
+
+        #? if the client_username is valid, send him a key request
+        #? (if the robot already asked for recharging, the key request waits until he is done -> check_recharge)
+        robot.phase = PHASE_KEY_ID
+        next_message = robot.frames.peek_frame(CLIENT_MESSAGES_MAX_LEN["CLIENT_RECHARGING"])
+        if next_message == CLIENT_RECHARGING_MESSAGES["CLIENT_RECHARGING"]:
+            robot.held_back = SERVER_MESSAGES["SERVER_KEY_REQUEST"]
+        else:
+            send(robot, SERVER_MESSAGES["SERVER_KEY_REQUEST"])
+
+    elif robot.phase == PHASE_KEY_ID:
+        #~ --- GET CLIENT'S KEY ID ---
+        robot.key_ID = check_key_ID(message)
+
+        #? send SERVER_CONFIRMATION (= calculated server_confirmation_key ) to the client
+        server_confirmation, robot.confirmation = robot.login_keys[robot.key_ID]
+        send(robot, server_confirmation)
+        robot.phase = PHASE_CONFIRMATION
+
+    elif robot.phase == PHASE_CONFIRMATION:
+        #~ --- GET CLIENT'S CONFIRMATION KEY ---
+        check_client_confirmation_key(message, robot.confirmation)
+
+        #? if the client_confirmation_key is correct, send SERVER_OK to the client and start navigating him
+        send(robot, SERVER_MESSAGES["SERVER_OK"])
+        get_start_position(robot)
+            
+
+def check_suffix(message: bytes):
+    if message[-2:] != SUFFIX:
+        raise SERVER_SYNTAX_ERROR(SERVER_MESSAGES["SERVER_SYNTAX_ERROR"])
+
+
+#? the syntax (at most CONFIRMATION_DIGITS digits) was already checked in get_message
+def check_client_confirmation_key(message: bytes, correct_client_key_value: int):
+    if int(message[:-2]) != correct_client_key_value:
+        raise SERVER_LOGIN_FAILED(SERVER_MESSAGES["SERVER_LOGIN_FAILED"])
+
+
+def calculate_confirmation_key(username: str, server_key: int):
+    # both of the messages suffix was already checked
+
+    ascii_sum = 0
+    for char in username:
+        ascii_sum += ord(char)
+
+    hash_value = (ascii_sum * 1000) % 65536
+
+    calculated_key = (hash_value + server_key) % 65536 
+
+    return calculated_key, hash_value                       
+
+
+#? Everything the login of a username needs, for every key ID: (SERVER_CONFIRMATION frame, expected CLIENT_CONFIRMATION).
+#? Robots reconnect with the same few names, so it is cached by the username as received -> a known robot costs one
+#? lookup here and one int comparison in check_client_confirmation_key. (lru_cache is thread safe and counts
+#? its hits and misses, server_metrics exports them.) A username that isn't valid UTF-8 raises ValueError.
+@functools.lru_cache(maxsize = AUTH_CACHE_SIZE)
+def login_keys(username: bytes):
+    name = username.decode(FORMAT).strip()
+    keys = []
+    for key_ID in range(len(SERVER_CLIENT_KEYS)):
+        server_key, client_key = SERVER_CLIENT_KEYS[key_ID]
+        server_confirmation_key, hash_value = calculate_confirmation_key(name, server_key)
+        keys.append((str(server_confirmation_key).encode(FORMAT) + SUFFIX, (hash_value + client_key) % 65536))
+    return tuple(keys)
+
+
+#? check if the key is ok (the syntax was already checked in get_message) and return it
+def check_key_ID(message: bytes):
+    key_ID = int(message[:-2])
+    if key_ID < 0 or key_ID > 4:
+        raise SERVER_KEY_OUT_OF_RANGE_ERROR(SERVER_MESSAGES["SERVER_KEY_OUT_OF_RANGE_ERROR"])    
+    return key_ID
+
+
+        #*========================================---- ↓ ROBOT NAVIGATION FUNCTIONS ↓ ----=====================================================
+
+#? Reply to a move/turn command (or to SERVER_PICK_UP) arrived -> update the robot and send him the next command
+def navigate_robot(robot: client_robot, message: bytes):
+    if robot.phase == PHASE_PICK_UP:
+        #? the robot picked up the message -> log him out
+        send(robot, SERVER_MESSAGES["SERVER_LOGOUT"])
+        robot.phase = PHASE_DONE
+        return None
+
+    get_coords_from_message(robot, message)
+
+    if robot.phase == PHASE_START_POSITION:
+        #? if the robot has spawned in the final position [0, 0] we dont't need to continue
+        if robot.position == (0, 0):
+            pick_up_message(robot)
+            return None
+        #? otherwise we have to get the direction the robot is facing
+        robot.phase = PHASE_START_DIRECTION
+        send_command(robot, "SERVER_MOVE")
+        return None
+
+    if robot.phase == PHASE_START_DIRECTION:
+        #? if the robot is stuck right after he spawn, 
+        #? we try to move the robot until we have his position and direction
+        if robot.direction == DIRECTION_NONE:
+            if robot.navigation == "search" and robot.commands >= 2 * len(DIRECTION_STEPS):
+                #? the robot tried to move in every direction -> he is walled in, we just close the connection
+                robot.error = "WALLED_IN"
+                robot.phase = PHASE_DONE
+                return None
+            send_command(robot, "SERVER_TURN_RIGHT" if robot.last_turn == 0 else "SERVER_MOVE")
+            return None
+        robot.phase = PHASE_NAVIGATION
+        if robot.expected_commands == -1:
+            robot.expected_commands = robot.commands + count_expected_commands(robot)
+
+    command = NAVIGATION_COMMANDS[robot.navigation](robot)
+    if command == "SERVER_PICK_UP":
+        pick_up_message(robot)
+    elif command is None:
+        #? the robot is walled in by obstacles -> he can't get to [0, 0], so we just close the connection
+        robot.error = "WALLED_IN"
+        robot.phase = PHASE_DONE
+    else:
+        send_command(robot, command)
+
+
+def classic_navigation_command(robot: client_robot):
+    #? finish dodging an obstacle first
+    command = robot_dodge(robot)
+    if command is not None:
+        return command
+
+    #? firstly we get the robot to the position y = 0, then to the position x = 0
+    #? (if he leaves y = 0 while dodging on the x axis, we start again with the y axis)
+    while True:
+        if robot.position[robot.axis] != 0:
+            return align_robot(robot, robot.axis) or "SERVER_MOVE"
+        if robot.position == (0, 0):
+            return "SERVER_PICK_UP"
+        robot.axis = 1 - robot.axis
+
+
+#? Take the shortest way: the axis order needing fewer turns, turning left or right whichever is shorter
+#? (replanned after every reply, so it also continues sensibly after a dodge)
+def planned_navigation_command(robot: client_robot):
+    command = robot_dodge(robot)
+    if command is not None:
+        return command
+
+    if robot.position == (0, 0):
+        return "SERVER_PICK_UP"
+    axis = plan_route(robot.position, robot.direction)[0]
+    return turn_towards(robot.direction, axis_direction(robot.position, axis)) or "SERVER_MOVE"
+
+
+#? Direction towards 0 on the axis, DIRECTION_NONE if the robot already is there
+def axis_direction(position: tuple[int, int], axis: int):
+    if position[axis] == 0:
+        return DIRECTION_NONE
+    if axis == 0:
+        return DIRECTION_RIGHT if position[0] < 0 else DIRECTION_LEFT
+    return DIRECTION_UP if position[1] < 0 else DIRECTION_DOWN
+
+
+def count_turns(direction: int, target: int):
+    if direction == DIRECTION_NONE or target == DIRECTION_NONE:
+        return 0
+    return (0, 1, 2, 1)[(target - direction) % 4]
+
+
+#? Returns the shorter turn towards the target direction, None if the robot already faces it
+def turn_towards(direction: int, target: int):
+    if direction == target or target == DIRECTION_NONE:
+        return None
+    if (target - direction) % 4 == 3:
+        return "SERVER_TURN_LEFT"
+    return "SERVER_TURN_RIGHT"
+
+
+#? Returns (axis to go along first, number of turns needed to get to [0, 0]); y axis first if both are equal
+def plan_route(position: tuple[int, int], direction: int):
+    x_target = axis_direction(position, 0)
+    y_target = axis_direction(position, 1)
+    if y_target == DIRECTION_NONE:
+        return 0, count_turns(direction, x_target)
+    if x_target == DIRECTION_NONE:
+        return 1, count_turns(direction, y_target)
+    y_first = count_turns(direction, y_target) + 1              #? the second axis is always one turn away
+    x_first = count_turns(direction, x_target) + 1
+    if y_first <= x_first:
+        return 1, y_first
+    return 0, x_first
+
+
+#? Number of move/turn commands the robot's navigation would send if there were no obstacles
+def count_expected_commands(robot: client_robot):
+    ghost = client_robot.__new__(client_robot)                  #? only the navigation state, no buffers
+    ghost.navigation, ghost.position, ghost.direction, ghost.axis = robot.navigation, robot.position, robot.direction, robot.axis
+    ghost.dodge, ghost.obstacles, ghost.path = [], None, None
+    commands = 0
+    while commands <= 4 * (abs(robot.position[0]) + abs(robot.position[1]) + 2):
+        command = NAVIGATION_COMMANDS[ghost.navigation](ghost)
+        if command == "SERVER_PICK_UP":
+            break
+        if command == "SERVER_MOVE":
+            dx, dy = DIRECTION_STEPS[ghost.direction]
+            ghost.position = (ghost.position[0] + dx, ghost.position[1] + dy)
+        elif command == "SERVER_TURN_LEFT":
+            ghost.direction = DIRECTIONS_TURN_LEFT[ghost.direction]
+        else:
+            ghost.direction = DIRECTIONS_TURN_RIGHT[ghost.direction]
+        commands += 1
+    return commands
+
+
+def pick_up_message(robot: client_robot):
+    # robot is now in the final position -> we pick up the message
+    send(robot, SERVER_MESSAGES["SERVER_PICK_UP"])
+    robot.phase = PHASE_PICK_UP
+
+
+#? Returns the turn the robot needs to make to face towards 0 on the axis, None if he already does
+def align_robot(robot: client_robot, axis: int):   #? axis = 0 means X ...
+    target = DIRECTION_NONE
+    if axis == 0:
+        if robot.position[0] < 0:
+            target = DIRECTION_RIGHT
+        elif robot.position[0] > 0:
+            target = DIRECTION_LEFT
+    elif axis == 1:
+        if robot.position[1] < 0:
+            target = DIRECTION_UP
+        elif robot.position[1] > 0:
+            target = DIRECTION_DOWN
+    if robot.direction == target or target == DIRECTION_NONE:
+        return None
+    return "SERVER_TURN_RIGHT"
+
+
+def get_start_position(robot: client_robot):
+    if LOG_DEBUG:
+        log.debug("%s GETTING STARTING POSITION...", robot)
+    #? first we need to get the coordinates of the robot
+    robot.phase = PHASE_START_POSITION
+    send_command(robot, "SERVER_TURN_RIGHT")
+
+
+#? Get the new robot coordinates and direction from the message, set the robot's position and and old_position
+def get_coords_from_message(robot: client_robot, message: bytes):
+    robot.old_position = robot.position                             #? turn = 0 = robot moved 
+    turn = robot.last_turn                                          #? turn = 1 = robot turned left
+                                                                    #? turn = 2 = robot turned right
+    # Convert the coordinates to integers and update the robot's position
+    robot.position = parse_coords(message)
+
+    #? Do NOT try to dodge an obstacle if:
+    #?  1) we are only getting the starting position
+    #?  2) the robot hits an obstacle right after he spawns
+    #?  3) the robot only turned right/left but didn't actually move
+    if (robot.position == robot.old_position) and (turn == 0) and (robot.direction != DIRECTION_NONE):
+        #? robot hit an obstacle
+        robot_hit_obstacle(robot)
+
+    if turn == 0:
+        get_robot_direction(robot)
+    elif turn == 1:
+        robot.direction = DIRECTIONS_TURN_LEFT[robot.direction]
+    elif turn == 2:
+        robot.direction = DIRECTIONS_TURN_RIGHT[robot.direction]
+    
+    if LOG_DEBUG and MOVE_LOG_LIMITER.allow():
+        log.debug("%s NEW POSITION: %s NEW DIRECTION: %s", robot, robot.position, DIRECTION_NAMES[robot.direction])
+
+
+#? Parse the "OK <x> <y>" message into (x, y) coordinates (the syntax was already checked in get_message)
+def parse_coords(message: bytes):
+    _, x, y = message[:-2].split(b" ")
+    return (int(x), int(y))
+
+
+def get_robot_direction(robot: client_robot):
+    dx = robot.position[0] - robot.old_position[0]
+    dy = robot.position[1] - robot.old_position[1]
+
+    if dx > 0:
+        robot.direction = DIRECTION_RIGHT
+    elif dx < 0:
+        robot.direction = DIRECTION_LEFT
+    elif dy > 0:
+        robot.direction = DIRECTION_UP
+    elif dy < 0:
+        robot.direction = DIRECTION_DOWN
+
+
+#? Returns the next command of the dodge in progress, None if the robot isn't dodging
+#? (the robot can hit another obstacle while dodging -> robot.dodge works as a stack of dodges)
+def robot_dodge(robot: client_robot):
+    while robot.dodge:
+        commands, step = robot.dodge[-1]
+        #? if the robot crosses an axis while dodging an obstacle we can stop dodging
+        if step == len(commands) or (step == ROBOT_DODGE_AXIS_CHECK and (robot.position[0] == 0 or robot.position[1] == 0)):
+            robot.dodge.pop()
+            continue
+        robot.dodge[-1][1] = step + 1
+        return commands[step]
+    return None
+
+
+def robot_hit_obstacle(robot: client_robot):
+    robot.obstacle_hits += 1
+    if robot.navigation == "search":
+        #? remember the obstacle and plan a new path around it
+        dx, dy = DIRECTION_STEPS[robot.direction]
+        robot.obstacles.add(cell_key(robot.position[0] + dx, robot.position[1] + dy))
+        robot.path = None
+    else:
+        robot.dodge.append([dodge_commands(robot), 0])
+
+
+#? Which way around the obstacle: the planner steps aside towards 0 on the other axis, so the detour isn't wasted
+#? (an obstacle hit while already dodging is dodged on the same side, otherwise the robot could swing between two obstacles)
+def dodge_commands(robot: client_robot):
+    if robot.navigation == "classic":
+        return ROBOT_DODGE_COMMANDS
+    if robot.dodge:
+        return robot.dodge[-1][0]
+    dx, dy = DIRECTION_STEPS[DIRECTIONS_TURN_RIGHT[robot.direction]]
+    x, y = robot.position
+    if abs(x + dx) + abs(y + dy) <= abs(x) + abs(y):
+        return ROBOT_DODGE_COMMANDS
+    return ROBOT_DODGE_COMMANDS_MIRRORED
+
+
+        #*========================================---- ↓ OBSTACLE AWARE NAVIGATION ↓ ----=====================================================
+
+#? One int per cell keeps the per-session obstacle memory small (|coordinate| < 2^31)
+def cell_key(x: int, y: int):
+    return (x << 32) + y
+
+
+def cell_position(key: int):
+    key += 1 << 31
+    return (key >> 32, (key & 0xFFFFFFFF) - (1 << 31))
+
+
+#? Follow the planned path, plan a new one only at the start and after the robot hits an obstacle we didn't know about
+def search_navigation_command(robot: client_robot):
+    if robot.position == (0, 0):
+        return "SERVER_PICK_UP"
+    if robot.obstacles is None:
+        robot.obstacles = set()
+    if not robot.path:
+        robot.path = plan_path(robot.position, robot.direction, robot.obstacles)
+        if robot.path is None:
+            return None
+    return robot.path.pop()
+
+
+#? A* over (x, y, direction) states; a move and a turn both cost one command.
+#? Unknown cells are expected to be free, the search is bounded by a box around the start, [0, 0] and the known obstacles
+#? (outside of it every cell is free, so if there is no path inside the box, there is none at all).
+#? Returns the commands in reverse order (so the next one is path.pop()), None if [0, 0] can't be reached.
+def plan_path(position: tuple[int, int], direction: int, obstacles: set[int]):
+    cells = [position, (0, 0)] + [cell_position(key) for key in obstacles]
+    xs = [cell[0] for cell in cells]
+    ys = [cell[1] for cell in cells]
+    min_x, max_x = min(xs) - SEARCH_MARGIN, max(xs) + SEARCH_MARGIN
+    min_y, max_y = min(ys) - SEARCH_MARGIN, max(ys) + SEARCH_MARGIN
+
+    start = (position[0], position[1], direction)
+    came_from = {start: None}
+    cost = {start: 0}
+    frontier = [(estimate_commands(start), 0, start)]
+    while frontier:
+        estimate, commands, state = heapq.heappop(frontier)
+        if commands > cost[state]:
+            continue
+        x, y, heading = state
+        if x == 0 and y == 0:
+            path = []
+            while came_from[state] is not None:
+                state, command = came_from[state]
+                path.append(command)
+            return path
+        dx, dy = DIRECTION_STEPS[heading]
+        for command, next_state in (
+            ("SERVER_MOVE",         (x + dx, y + dy, heading)),
+            ("SERVER_TURN_LEFT",    (x, y, (heading - 1) % 4)),
+            ("SERVER_TURN_RIGHT",   (x, y, (heading + 1) % 4))
+        ):
+            next_x, next_y = next_state[0], next_state[1]
+            if not (min_x <= next_x <= max_x and min_y <= next_y <= max_y) or cell_key(next_x, next_y) in obstacles:
+                continue
+            if commands + 1 < cost.get(next_state, commands + 2):
+                cost[next_state] = commands + 1
+                came_from[next_state] = (state, command)
+                heapq.heappush(frontier, (commands + 1 + estimate_commands(next_state), commands + 1, next_state))
+    return None
+
+
+#? Lower bound of the commands needed from the state (the same route without obstacles)
+def estimate_commands(state: tuple[int, int, int]):
+    x, y, heading = state
+    return abs(x) + abs(y) + plan_route((x, y), heading)[1]
+
+
+     #*==========================================---- ↓ ROBOT  RECHARGING ↓ ----=============================================================
+
+#? Returns True if the message was a part of recharging (and so it is not meant for the current phase)
+def check_recharge(robot: client_robot, message: bytes):
+    if robot.recharging:
+        robot_recharging(robot, message)
+        return True
+    if message == CLIENT_RECHARGING_MESSAGES["CLIENT_RECHARGING"]:
+        if LOG_DEBUG:
+            log.debug("%s STARTING ROBOT RECHARGING", robot)
+        robot.recharging = True
+        robot.recharges += 1
+        return True
+    if message == CLIENT_RECHARGING_MESSAGES["CLIENT_FULL_POWER"]:
+        raise SERVER_LOGIC_ERROR(SERVER_MESSAGES["SERVER_LOGIC_ERROR"])
+    return False
+
+
+def robot_recharging(robot: client_robot, message: bytes):
+    if message != CLIENT_RECHARGING_MESSAGES["CLIENT_FULL_POWER"]:
+        raise SERVER_LOGIC_ERROR(SERVER_MESSAGES["SERVER_LOGIC_ERROR"])
+    robot.recharging = False
+    if robot.held_back:
+        send(robot, robot.held_back)
+        robot.held_back = b''
+
+
+#* next move/turn command (or SERVER_PICK_UP) of each navigation mode
+NAVIGATION_COMMANDS = {
+    "classic":  classic_navigation_command,
+    "planner":  planned_navigation_command,
+    "search":   search_navigation_command
+}
+
+
+    #*==========================================---- ↓ SESSION ↓ ----=============================================================
+
+#? Sans-IO session: feed it the bytes received from the client, it returns the bytes to send back
+#? and the deadline (time.monotonic) until which the client has to send more data.
+#? It also measures how long the session spent in each stage (STAGE_NAMES) for server_metrics.
+class robot_session:
+    __slots__ = ("robot", "config", "deadline", "closed", "started", "stage_started", "recharge_started", "timings", "timer",
+                 "profile")
+
+    def __init__(self, now: float, config: server_config = None, address = None):
+        self.config = config if config is not None else DEFAULT_CONFIG
+        self.robot = client_robot(self.config.navigation, self.config.report_commands)
+        self.robot.address = address
+        self.deadline: float = now + TIMEOUT
+        self.closed: bool = False
+        self.started: float = now
+        self.stage_started: float = now                 # when the current phase began
+        self.recharge_started: float = now
+        self.timings: list[float] = [0.0] * len(STAGE_NAMES)
+        self.timer: int = -1                            # tick of the session's deadline_wheel entry
+        self.profile: tuple = None                      # session_profiler.session() if the session is profiled
+
+    def timeout(self):
+        return TIMEOUT_RECHARGING if self.robot.recharging else TIMEOUT
+
+    def receive_data(self, data: bytes, now: float):
+        self.feed(data, now)
+        return self.data_to_send()
+
+    #? receive_data without taking the replies: they stay in robot.outbox for a frame_writer
+    def feed(self, data: bytes, now: float):
+        try:
+            self.robot.frames.feed(data)
+        except SERVER_SYNTAX_ERROR:
+            phase, recharging = self.robot.phase, self.robot.recharging
+            self.fail("SERVER_SYNTAX_ERROR")
+            self.measure(now, phase, recharging)
+            return None
+        self.process(now)
+
+    #? Handle every complete message already in robot.frames (adapters can recv_into robot.frames directly);
+    #? the replies are left in robot.outbox (see frame_writer and data_to_send)
+    def process(self, now: float):
+        robot = self.robot
+        phase, recharging = robot.phase, robot.recharging
+        if self.config.session_budget and robot.frames.received > self.config.session_budget:
+            #? a robot sending this much is broken or abusing the connection -> closed without a reply
+            if LOG_DEBUG:
+                log.debug("%s sent more than %d B, disconnecting.", robot, self.config.session_budget)
+            self.disconnect("BUDGET_EXCEEDED")
+            self.measure(now, phase, recharging)
+            return None
+        try:
+            while robot.phase != PHASE_DONE:
+                message = get_message(robot)
+                if message is None:
+                    break
+                if check_recharge(robot, message):
+                    continue
+                if robot.phase <= PHASE_CONFIRMATION:
+                    authenticate_client(robot, message)
+                else:
+                    navigate_robot(robot, message)
+        except (SERVER_SYNTAX_ERROR, SERVER_KEY_OUT_OF_RANGE_ERROR, SERVER_LOGIN_FAILED, SERVER_LOGIC_ERROR) as error:
+            self.fail(type(error).__name__)
+        except ValueError:                                      #? message can't be decoded or converted to a number
+            self.fail("SERVER_SYNTAX_ERROR")
+        else:
+            if robot.phase == PHASE_DONE:
+                self.closed = True
+                if self.config.report_commands:
+                    log.info("%s [COMMANDS] expected %d, sent %d", robot, robot.expected_commands, robot.commands)
+            self.deadline = now + self.timeout()
+        self.measure(now, phase, recharging)
+
+    #? client didn't send anything before the deadline -> the connection is just closed
+    def expire(self, now: float):
+        phase, recharging = self.robot.phase, self.robot.recharging
+        self.disconnect("TIMEOUT")
+        self.robot.recharging = False
+        self.measure(now, phase, recharging)
+        return b''
+
+    #? phase/recharging before the last event -> add the time spent in it to the stage timings
+    def measure(self, now: float, phase: int, recharging: bool):
+        robot = self.robot
+        if robot.phase != phase:
+            self.timings[PHASE_STAGES[phase]] += now - self.stage_started
+            self.stage_started = now
+        if robot.recharging != recharging:
+            if recharging:
+                self.timings[STAGE_RECHARGING] += now - self.recharge_started
+            else:
+                self.recharge_started = now
+
+    #? the connection ended before the session was finished (error = "TIMEOUT", "DISCONNECTED", ...)
+    def disconnect(self, error: str):
+        if not self.robot.error and self.robot.phase != PHASE_DONE:
+            self.robot.error = error
+        self.robot.phase = PHASE_DONE
+        self.closed = True
+
+    def fail(self, error_type: str):
+        send(self.robot, SERVER_MESSAGES[error_type])
+        self.robot.error = error_type
+        self.robot.phase = PHASE_DONE
+        self.closed = True
+
+    def completed(self):
+        return self.robot.phase == PHASE_DONE and not self.robot.error
+
+    def data_to_send(self):
+        outbox = self.robot.outbox
+        if not outbox:
+            return b''
+        data = outbox[0] if len(outbox) == 1 else b''.join(outbox)
+        outbox.clear()
+        return data
+
+#|=================================================================================================================================================================
+
+#! CLIENTS HANDLING FUNCTIONS
+
+def close_client(conn):
+    conn.close()
+
+
+# Handle individual clients separately
+# Running for each client individually
+#? The socket stays blocking without a timeout: when the session's deadline passes, expire_deadlines shuts it down
+def handle_client(conn, addr, deadlines: deadline_wheel, config: server_config = None, parking: "session_parking" = None):   #TODO - delete addr from arguments
+    config = config if config is not None else DEFAULT_CONFIG
+    session = robot_session(time.monotonic(), config, addr)
+    config.metrics.open_session()
+    if LOG_DEBUG:
+        log.debug("[NEW CONNECTION] %s connected.", addr)
+    output = frame_writer(conn, session.robot.outbox)
+    recording = config.recorder.start(session.started, addr) if config.recorder is not None else None
+    session.profile = PROFILER.session() if PROFILER.active else None
+    deadlines.schedule(session, conn)
+    serve_connection(conn, session, output, deadlines, config, parking, recording)
+
+
+#? Runs the session until it ends - or, with parking, until the robot starts recharging: then the session waits
+#? in session_parking and the worker is free for other robots. It continues here (on any worker) with its state
+#? untouched once the robot sends something or its deadline passes.
+def serve_connection(conn, session: robot_session, output: frame_writer, deadlines: deadline_wheel, config: server_config,
+                     parking: "session_parking" = None, recording: session_recording = None):
+    frames = session.robot.frames
+    profile = PROFILER.enable(session.profile)
+    try:
+        while not session.closed:
+            received = frames.recv_from(conn)
+            if received == 0:                                   #? client closed the connection or the deadline passed
+                now = time.monotonic()
+                if now >= session.deadline:
+                    session.expire(now)
+                break
+            now = time.monotonic()
+            if recording is not None:
+                recording.add(RECORD_RECEIVED, frames.view[frames.end - received:frames.end], now)
+            session.process(now)
+            deadlines.update(session, conn)
+            if recording is not None and output.frames:
+                recording.add(RECORD_SENT, b''.join(output.frames), now)
+            output.flush()
+            if parking is not None and session.robot.recharging and not session.closed and parking.reserve():
+                if profile is not None:                         #? before another worker can resume the session
+                    profile.disable()
+                parking.park(conn, session, output, recording)
+                return None
+    except OSError:
+        pass
+    if profile is not None:
+        profile.disable()
+    session.disconnect("DISCONNECTED")
+    count_session(session, config)
+    if session.profile is not None:
+        PROFILER.add(*session.profile)
+    if recording is not None:
+        config.recorder.write(recording, time.monotonic())
+
+    #? the robot picked up the message and was logged out, or the communication failed -> we close the connection
+    if LOG_DEBUG:
+        log.debug("%s disconnected (%s).", session.robot, session.robot.error or "completed")
+    close_client(conn)
+
+
+#? one thread for the deadlines of all sessions: shut down the sockets of the expired ones, their threads do the rest
+def expire_deadlines(deadlines: deadline_wheel):
+    while True:
+        time.sleep(deadlines.resolution)
+        for conn in deadlines.expire(time.monotonic()):
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:                                     #? closed in the meantime
+                pass
+
+
+def count_session(session: robot_session, config: server_config):
+    config.counters.add(COUNTER_COMPLETED if session.completed() else COUNTER_FAILED)
+    config.metrics.close_session(session, time.monotonic())
+
+
+#? GET /metrics -> Prometheus text format. Runs in its own thread, so it works with both modes.
+def start_metrics_server(port: int, config: server_config, host: str = METRICS_HOST):
+    class metrics_handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path not in ("/metrics", "/"):
+                self.send_error(404)
+                return None
+            body = config.metrics.render(config.counters).encode(FORMAT)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        #? POST /profile/start?sample=0.1&seconds=30&functions=get_message,robot_dodge, POST /profile/stop
+        def do_POST(self):
+            url = urllib.parse.urlsplit(self.path)
+            query = dict(urllib.parse.parse_qsl(url.query))
+            if url.path == "/profile/start":
+                try:
+                    functions = config.profile_functions
+                    if "functions" in query:
+                        functions = tuple(name for name in query["functions"].split(",") if name)
+                    started = PROFILER.start(config.profile_path, float(query.get("sample", config.profile_sample)),
+                                             float(query.get("seconds", config.profile_seconds)), functions)
+                except ValueError as error:
+                    self.send_error(400, str(error))
+                    return None
+                self.reply("profiling started\n" if started else "already profiling\n")
+            elif url.path == "/profile/stop":
+                path = PROFILER.stop()
+                self.reply(f"stats written to {path}\n" if path else "not profiling\n")
+            else:
+                self.send_error(404)
+
+        def reply(self, text: str):
+            body = text.encode(FORMAT)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):                  #? no access log on stderr
+            pass
+
+    server = http.server.ThreadingHTTPServer((host, port), metrics_handler)
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+    log.info("[METRICS] http://%s:%d/metrics", host, port)
+    return server
+
+
+#? the server is full -> the robot is disconnected right away, without a session
+def reject_client(conn, config: server_config):
+    config.counters.add(COUNTER_REJECTED)
+    close_client(conn)
+
+
+#? Recharging robots are quiet for up to TIMEOUT_RECHARGING, so their sessions wait here instead of blocking a worker:
+#? one thread watches all their sockets with a selector and gives a session back to the pool as soon as its socket
+#? is readable - FULL POWER arrived (or anything else, which check_recharge turns into a logic error), the robot left,
+#? or expire_deadlines shut the socket down.
+class session_parking:
+    __slots__ = ("pool", "selector", "incoming", "lock", "wakeup", "wakeup_signal")
+
+    def __init__(self, pool: "session_pool"):
+        self.pool = pool
+        self.selector = selectors.DefaultSelector()
+        self.incoming = []                                      # (conn, session, output, recording) not registered yet
+        self.lock = threading.Lock()
+        self.wakeup, self.wakeup_signal = socket.socketpair()   #? interrupts select() when a session is parked
+        self.wakeup.setblocking(False)
+        self.selector.register(self.wakeup, selectors.EVENT_READ)
+        threading.Thread(target = self.run, daemon = True).start()
+
+    #? A parked session waits without a worker like a queued connection does, so it takes one of the queue's slots
+    #? (config.queue_size) until a worker takes it again: open connections stay below max_sessions + queue_size.
+    #? False if there is none -> the session recharges on its worker.
+    def reserve(self):
+        return self.pool.slots.acquire(False)
+
+    #? called by the worker that gives the session up (after reserve); the selector itself is only touched by the parking thread
+    def park(self, conn, session: robot_session, output: frame_writer, recording: session_recording = None):
+        self.pool.config.metrics.park_session(1)
+        if LOG_DEBUG:
+            log.debug("%s parked while recharging.", session.robot)
+        with self.lock:
+            self.incoming.append((conn, session, output, recording))
+        self.wakeup_signal.send(b"\0")
+
+    def run(self):
+        while True:
+            for key, _ in self.selector.select():
+                if key.fileobj is self.wakeup:
+                    self.register()
+                    continue
+                self.selector.unregister(key.fileobj)
+                self.unpark(*key.data)
+
+    def register(self):
+        try:
+            while self.wakeup.recv(RECV_SIZE):
+                pass
+        except BlockingIOError:
+            pass
+        with self.lock:
+            incoming, self.incoming = self.incoming, []
+        for parked in incoming:
+            try:
+                self.selector.register(parked[0], selectors.EVENT_READ, parked)
+            except (ValueError, OSError):                       #? the socket is already closed -> the worker ends the session
+                self.unpark(*parked)
+
+    def unpark(self, conn, session: robot_session, output: frame_writer, recording: session_recording):
+        self.pool.config.metrics.park_session(-1)
+        self.pool.resume(conn, session, output, recording)
+
+
+#? Fixed number of worker threads serving the accepted connections from a bounded queue, so a reconnect storm
+#? queues up (and is turned away) instead of slowing down every session in progress.
+#? The workers take (function, arguments) from two queues: parked sessions coming back, which are never turned away,
+#? and new connections. Both wait without a worker, together at most config.queue_size of them (slots).
+class session_pool:
+    __slots__ = ("pending", "resumed", "ready", "slots", "workers", "deadlines", "config", "draining", "parking")
+
+    def __init__(self, deadlines: deadline_wheel, config: server_config):
+        self.pending = collections.deque()                      # (function, arguments) of new connections
+        self.resumed = collections.deque()                      # the same for parked sessions, taken before pending
+        self.ready = threading.Condition()                      # guards both queues
+        self.slots = threading.Semaphore(config.queue_size)    # free places for connections waiting without a worker
+        self.deadlines = deadlines
+        self.config = config
+        self.draining: bool = False
+        self.parking = session_parking(self)
+        self.workers = [threading.Thread(target = self.run, daemon = True) for _ in range(config.max_sessions)]
+        for worker in self.workers:
+            worker.start()
+
+    #? False if the queue is full; reserved -> the caller already took a slot
+    def submit(self, conn, addr, reserved: bool = False):
+        if not reserved and not self.slots.acquire(False):
+            return False
+        with self.ready:
+            self.pending.append((self.serve, (conn, addr, time.monotonic())))
+            self.ready.notify()
+        return True
+
+    #? A parked session already had its worker and its deadline keeps running -> the next free worker takes it,
+    #? before any new connection
+    def resume(self, conn, session: robot_session, output: frame_writer, recording: session_recording = None):
+        with self.ready:
+            self.resumed.append((self.serve_resumed, (conn, session, output, recording)))
+            self.ready.notify()
+
+    def run(self):
+        while True:
+            with self.ready:
+                while not self.resumed and not self.pending:
+                    self.ready.wait()
+                function, arguments = self.resumed.popleft() if self.resumed else self.pending.popleft()
+            function(*arguments)
+
+    def serve_resumed(self, conn, session: robot_session, output: frame_writer, recording: session_recording):
+        self.slots.release()                                    #? taken by session_parking.reserve
+        serve_connection(conn, session, output, self.deadlines, self.config, self.parking, recording)
+
+    def serve(self, conn, addr, accepted: float):
+        self.slots.release()
+        if self.draining or time.monotonic() - accepted > self.config.queue_wait:
+            reject_client(conn, self.config)
+            return None
+        handle_client(conn, addr, self.deadlines, self.config, self.parking)
+
+    #? close the connections that are still waiting and let the sessions in progress (parked ones too) finish
+    def drain(self, timeout: float):
+        self.draining = True
+        deadline = time.monotonic() + timeout
+        while (self.config.metrics.active or self.pending or self.resumed) and time.monotonic() < deadline:
+            time.sleep(DEADLINE_RESOLUTION)
+        return self.config.metrics.active
+
+
+#? Handle new connections and distribute them between clients.
+#? SIGTERM/Ctrl+C only set `stopping`: the kernel may deliver a signal to any thread but Python runs the handlers
+#? in the main thread, so the main thread waits in a selector that signal.set_wakeup_fd wakes up, not in accept().
+def start(server, config: server_config = None):
+    config = config if config is not None else DEFAULT_CONFIG
+    raise_open_files_limit()
+    log.info("[LISTENING] Server is listening on %s", server.getsockname()[0])
+    deadlines = deadline_wheel(time.monotonic())
+    threading.Thread(target = expire_deadlines, args = (deadlines,), daemon = True).start()
+    pool = session_pool(deadlines, config)
+    stopping = threading.Event()
+    wakeup, wakeup_signal = socket.socketpair()
+    wakeup.setblocking(False)
+    wakeup_signal.setblocking(False)
+    server.setblocking(False)
+    selector = selectors.DefaultSelector()
+    selector.register(server, selectors.EVENT_READ)
+    selector.register(wakeup, selectors.EVENT_READ)
+    previous_wakeup = signal.set_wakeup_fd(wakeup_signal.fileno())
+    previous_handlers = {signum: signal.getsignal(signum) for signum in (signal.SIGTERM, signal.SIGINT)}
+    for signum, handler in previous_handlers.items():
+        if handler is not signal.SIG_IGN:                       #? e.g. SIGINT of a server started in the background
+            signal.signal(signum, lambda signum, frame: stopping.set())
+    try:
+        while not stopping.is_set():
+            for key, _ in selector.select():
+                if key.fileobj is wakeup:
+                    try:
+                        while wakeup.recv(RECV_SIZE):
+                            pass
+                    except BlockingIOError:
+                        pass
+                else:
+                    accept_client(server, pool, config, stopping)
+    finally:
+        #? a second Ctrl+C cuts the draining short, a second SIGTERM (e.g. from the supervisor of --workers) doesn't
+        signal.signal(signal.SIGINT, previous_handlers[signal.SIGINT])
+        signal.set_wakeup_fd(previous_wakeup)
+        selector.close()
+        wakeup.close()
+        wakeup_signal.close()
+    server.close()
+    log.info("[DRAINING] waiting up to %s s for the sessions in progress", config.drain_timeout)
+    unfinished = pool.drain(config.drain_timeout)
+    log.info("[STOPPED] %d sessions didn't finish", unfinished)
+    signal.signal(signal.SIGTERM, previous_handlers[signal.SIGTERM])
+
+
+def accept_client(server, pool: session_pool, config: server_config, stopping: threading.Event):
+    try:
+        conn, addr = server.accept()
+    except (BlockingIOError, InterruptedError, ConnectionAbortedError):
+        return None
+    except OSError as error:
+        if error.errno not in ACCEPT_RETRY_ERRORS:
+            raise
+        #? out of file descriptors: the connection stays in the listen backlog, the sessions in progress
+        #? close theirs meanwhile (like asyncio, which stops accepting for a while too)
+        log.warning("[ACCEPT] %s, not accepting for %s s", error.strerror, ACCEPT_RETRY_DELAY)
+        stopping.wait(ACCEPT_RETRY_DELAY)
+        return None
+    config.counters.add(COUNTER_ACCEPTED)
+    if config.overload == "defer":
+        #? a full queue blocks the accept loop and new robots wait in the listen backlog, stopping is checked meanwhile
+        while not pool.slots.acquire(timeout = DEADLINE_RESOLUTION):
+            if stopping.is_set():
+                reject_client(conn, config)
+                return None
+        pool.submit(conn, addr, reserved = True)
+    elif not pool.submit(conn, addr):
+        reject_client(conn, config)
+    if LOG_DEBUG:
+        log.debug("[QUEUED CONNECTIONS] %d", len(pool.pending))
+
+
+#|=================================================================================================================================================================
+
+#! ASYNCIO SERVER
+#? Same sessions as above, but every session is a coroutine on one event loop instead of a thread.
+#? A waiting robot costs only its reader/writer objects, so a single process can hold tens of thousands of sessions.
+
+async def async_handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, deadlines: deadline_wheel,
+                              config: server_config = None):
+    config = config if config is not None else DEFAULT_CONFIG
+    session = robot_session(time.monotonic(), config, writer.get_extra_info("peername"))
+    config.metrics.open_session()
+    if LOG_DEBUG:
+        log.debug("[NEW CONNECTION] %s connected.", session.robot.address)
+    recording = config.recorder.start(session.started, session.robot.address) if config.recorder is not None else None
+    session.profile = PROFILER.session() if PROFILER.active else None
+    output = transport_writer(writer, session.robot.outbox)
+    deadlines.schedule(session, writer)
+    try:
+        while not session.closed:
+            if session.robot.recharging:                        #? a waiting coroutine holds no worker -> only counted
+                config.metrics.park_session(1)
+                try:
+                    data = await reader.read(RECV_SIZE)
+                finally:
+                    config.metrics.park_session(-1)
+            else:
+                data = await reader.read(RECV_SIZE)
+            if not data:                                        #? client closed the connection or the deadline passed
+                now = time.monotonic()
+                if now >= session.deadline:
+                    session.expire(now)
+                break
+            now = time.monotonic()
+            if recording is not None:
+                recording.add(RECORD_RECEIVED, data, now)
+            profile = PROFILER.enable(session.profile)
+            session.feed(data, now)
+            if profile is not None:
+                profile.disable()
+            deadlines.update(session, writer)
+            if recording is not None and output.frames:
+                recording.add(RECORD_SENT, b''.join(output.frames), now)
+            output.flush()
+    except (ConnectionError, OSError):
+        pass
+    session.disconnect("DISCONNECTED")
+    count_session(session, config)
+    if recording is not None:
+        config.recorder.write(recording, time.monotonic())
+    if session.profile is not None:
+        PROFILER.add(*session.profile)
+    if LOG_DEBUG:
+        log.debug("%s disconnected (%s).", session.robot, session.robot.error or "completed")
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except (ConnectionError, OSError):
+        pass
+
+
+#? one task for the deadlines of all sessions instead of a timer per read: closing the transport ends the session's read
+async def async_expire_deadlines(deadlines: deadline_wheel):
+    while True:
+        await asyncio.sleep(deadlines.resolution)
+        for writer in deadlines.expire(time.monotonic()):
+            writer.close()
+
+
+#? Same admission control as session_pool: at most config.max_sessions sessions, the connections over it
+#? wait for a slot (up to config.queue_wait). There is no pausing the accept loop here, so with --overload defer
+#? the waiting connections are not limited by config.queue_size.
+async def async_start(listener: socket.socket, config: server_config = None):
+    config = config if config is not None else DEFAULT_CONFIG
+    deadlines = deadline_wheel(time.monotonic())
+    slots = asyncio.Semaphore(config.max_sessions)
+    sessions = set()
+    waiting = 0
+    stop = asyncio.Event()
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        nonlocal waiting
+        config.counters.add(COUNTER_ACCEPTED)
+        if slots.locked():
+            if config.overload == "reject" and waiting >= config.queue_size:
+                reject_client(writer, config)
+                return None
+            waiting += 1
+            try:
+                await asyncio.wait_for(slots.acquire(), config.queue_wait)
+            except asyncio.TimeoutError:
+                reject_client(writer, config)
+                return None
+            finally:
+                waiting -= 1
+        else:
+            await slots.acquire()
+        if stop.is_set():                                       #? draining, no new sessions
+            slots.release()
+            reject_client(writer, config)
+            return None
+        task = asyncio.current_task()
+        sessions.add(task)
+        try:
+            await async_handle_client(reader, writer, deadlines, config)
+        except asyncio.CancelledError:                          #? unfinished when the drain timed out; asyncio.streams
+            writer.close()                                      #? of some Python versions logs a cancelled handler as an error
+        finally:
+            sessions.discard(task)
+            slots.release()
+
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop.set)
+    if hasattr(signal, "SIGUSR1"):                              #? profiling on/off, dumping the stats in a thread
+        loop.add_signal_handler(signal.SIGUSR1, toggle_profiling, config)
+    server = await asyncio.start_server(handle, sock = listener, backlog = config.backlog)
+    log.info("[LISTENING] Server (asyncio) is listening on %s", listener.getsockname()[0])
+    expiring = asyncio.create_task(async_expire_deadlines(deadlines))
+    await stop.wait()
+
+    server.close()
+    log.info("[DRAINING] waiting up to %s s for the sessions in progress", config.drain_timeout)
+    unfinished = 0
+    if sessions:
+        done, pending = await asyncio.wait(sessions, timeout = config.drain_timeout)
+        unfinished = len(pending)
+    log.info("[STOPPED] %d sessions didn't finish", unfinished)
+    expiring.cancel()
+
+
+def raise_open_files_limit():
+    #? every session holds one socket -> we need as many file descriptors as we want concurrent robots
+    try:
+        import resource
+    except ImportError:                                         #? not available on Windows
+        return None
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        except (ValueError, OSError):
+            pass
+
+
+def run_asyncio_server(listener: socket.socket, config: server_config = None):
+    raise_open_files_limit()
+    try:
+        import uvloop                                           #? optional, faster event loop
+    except ImportError:
+        pass
+    else:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    asyncio.run(async_start(listener, config))
+
+
+#|=================================================================================================================================================================
+
+#! PRE-FORKED WORKERS
+#? --workers N: N processes, each with its own accept loop. With SO_REUSEPORT every worker binds its own socket
+#? to the port and the kernel spreads the connections between them, otherwise they share the supervisor's socket.
+
+def create_listener(host: str, port: int, backlog: int, reuse_port: bool = False):
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    server.bind((host, port))
+    server.listen(backlog)
+    return server
+
+
+#? SIGUSR1: the stats are written in a thread, not in the signal handler / event loop
+def toggle_profiling(config: server_config):
+    threading.Thread(target = PROFILER.toggle, args = (config,), daemon = True).start()
+
+
+def serve(listener: socket.socket, mode: str, config: server_config):
+    #? SIGTERM -> SystemExit until the accept loop takes SIGTERM/Ctrl+C over to stop accepting and drain (start, async_start)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: toggle_profiling(config))
+    if config.recorder is not None:
+        config.recorder.start_writer()
+    try:
+        if mode == "asyncio":
+            run_asyncio_server(listener, config)
+        else:
+            start(listener, config)
+    finally:
+        if config.recorder is not None:
+            config.recorder.stop_writer()
+
+
+def run_worker(index: int, host: str, port: int, mode: str, config: server_config, shared_counters, listener: socket.socket = None):
+    config.counters = server_counters(shared_counters, index * len(COUNTER_NAMES))
+    log_writer = setup_logging(config.log_level, config.log_moves)     #? the writer thread doesn't survive fork
+    config.metrics = server_metrics()
+    if config.metrics_port:
+        start_metrics_server(config.metrics_port + index, config)  #? every worker has its own endpoint
+    if listener is None:
+        listener = create_listener(host, port, config.backlog, reuse_port = True)
+    log.info("[WORKER %d] started (pid %d)", index, multiprocessing.current_process().pid)
+    try:
+        serve(listener, mode, config)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        log_writer.stop()                                       #? a worker process exits without running atexit
+
+
+def run_workers(host: str, port: int, mode: str, config: server_config, workers: int, stats_interval: float = STATS_INTERVAL):
+    context = multiprocessing.get_context("fork")
+    #? every worker has its own slice of counters, the slice stays when the worker is restarted so nothing is lost
+    shared_counters = context.RawArray("q", workers * len(COUNTER_NAMES))
+    listener = None
+    if not hasattr(socket, "SO_REUSEPORT"):
+        listener = create_listener(host, port, config.backlog)
+
+    def spawn(index: int):
+        process = context.Process(target = run_worker, args = (index, host, port, mode, config, shared_counters, listener), daemon = True)
+        process.start()
+        return process
+
+    #? SIGTERM -> SystemExit, so the supervisor stops its workers and the workers exit cleanly too
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    processes = [spawn(index) for index in range(workers)]
+    if hasattr(signal, "SIGUSR1"):                              #? SIGUSR1 to the supervisor -> every worker toggles profiling
+        signal.signal(signal.SIGUSR1, lambda signum, frame: [os.kill(process.pid, signal.SIGUSR1) for process in processes])
+    restarts = 0
+    log.info("[SUPERVISOR] %d workers listening on %s:%d", workers, host, port)
+    terminate = True                                            #? SIGTERM (SystemExit) -> passed on to the workers
+    try:
+        while True:
+            time.sleep(stats_interval)
+            for index, process in enumerate(processes):
+                if not process.is_alive():
+                    log.warning("[SUPERVISOR] worker %d exited with %s, restarting", index, process.exitcode)
+                    processes[index] = spawn(index)
+                    restarts += 1
+            totals = [sum(shared_counters[counter::len(COUNTER_NAMES)]) for counter in range(len(COUNTER_NAMES))]
+            stats = " ".join(f"{name}={value}" for name, value in zip(COUNTER_NAMES, totals))
+            log.info("[SUPERVISOR] %s restarts=%d", stats, restarts)
+    except KeyboardInterrupt:                                   #? Ctrl+C reached the whole process group, the workers drain already
+        terminate = False
+    finally:
+        stop_workers(processes, terminate, config.drain_timeout + WORKER_EXIT_GRACE)
+
+
+#? terminate -> SIGTERM to the workers (the supervisor got it alone); never a second signal to a draining worker,
+#? one that doesn't exit in time (or after a second Ctrl+C) is killed
+def stop_workers(processes: list, terminate: bool, timeout: float):
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    if terminate:
+        for process in processes:
+            process.terminate()
+    deadline = time.monotonic() + timeout
+    try:
+        for process in processes:
+            process.join(max(0, deadline - time.monotonic()))
+    except KeyboardInterrupt:
+        pass
+    for process in processes:
+        if process.is_alive():
+            log.warning("[SUPERVISOR] worker pid %d didn't stop, killing it", process.pid)
+            process.kill()
+            process.join()
+
+
+#|=================================================================================================================================================================
+
+#! ########################---- START THE SERVER ----################################
+SERVER_MODES = ("threads", "asyncio")
+
+def parse_args(argv = None):
+    parser = argparse.ArgumentParser(description = "Robot navigation server")
+    parser.add_argument("--host", default = None, help = "address to bind (default: this machine's hostname address)")
+    parser.add_argument("--port", type = int, default = PORT)
+    parser.add_argument("--mode", choices = SERVER_MODES, default = "threads", help = "serving engine")
+    parser.add_argument("--navigation", choices = NAVIGATION_MODES, default = "planner", help = "navigation strategy")
+    parser.add_argument("--report-commands", action = "store_true", help = "print expected and sent commands of every session")
+    parser.add_argument("--log-level", choices = LOG_LEVELS, default = "INFO", help = "DEBUG logs every message of every session")
+    parser.add_argument("--log-moves", type = float, default = LOG_MOVES_PER_SECOND, help = "max. NEW POSITION records per second with DEBUG")
+    parser.add_argument("--metrics-port", type = int, default = 0, help = "serve Prometheus metrics on 127.0.0.1:PORT/metrics (0 = off)")
+    parser.add_argument("--backlog", type = int, default = None, help = f"listen backlog (default: {BACKLOG}, asyncio {ASYNC_BACKLOG})")
+    parser.add_argument("--max-sessions", type = int, default = None,
+                        help = f"sessions served at the same time (default: {MAX_SESSIONS}, asyncio {ASYNC_MAX_SESSIONS})")
+    parser.add_argument("--queue-size", type = int, default = QUEUE_SIZE, help = "connections waiting for a free session")
+    parser.add_argument("--queue-wait", type = float, default = QUEUE_WAIT, help = "(s) a connection waiting longer is closed")
+    parser.add_argument("--overload", choices = OVERLOAD_POLICIES, default = "reject", help = "full queue: close new connections or stop accepting")
+    parser.add_argument("--drain-timeout", type = float, default = DRAIN_TIMEOUT, help = "(s) SIGTERM waits this long for the sessions in progress")
+    parser.add_argument("--session-budget", type = int, default = SESSION_BUDGET, help = "bytes a robot may send in one session (0 = no limit)")
+    parser.add_argument("--profile-path", default = PROFILE_PATH, help = "where SIGUSR1 profiling writes its stats ({pid} = process id)")
+    parser.add_argument("--profile-sample", type = float, default = PROFILE_SAMPLE, help = "share of the sessions profiled")
+    parser.add_argument("--profile-seconds", type = float, default = PROFILE_SECONDS, help = "(s) profiling stops by itself after this, 0 = never")
+    parser.add_argument("--profile-functions", default = ",".join(PROFILE_FUNCTIONS), help = "comma separated functions timed while profiling")
+    parser.add_argument("--record", default = None, metavar = "PATH", help = "append the sessions to a recording for replay_sessions.py")
+    parser.add_argument("--record-sample", type = float, default = 1.0, help = "share of the sessions recorded with --record")
+    parser.add_argument("--workers", type = int, default = 1, help = "number of pre-forked worker processes")
+    parser.add_argument("--stats-interval", type = float, default = STATS_INTERVAL, help = "(s) how often --workers prints the counters")
+    return parser.parse_args(argv)
+
+
+def main(argv = None):
+    args = parse_args(argv)
+    host = args.host if args.host is not None else socket.gethostbyname(socket.gethostname())
+    asyncio_mode = args.mode == "asyncio"
+    config = server_config(args.navigation, args.report_commands, args.log_level, args.log_moves, args.metrics_port,
+                           backlog = args.backlog or (ASYNC_BACKLOG if asyncio_mode else BACKLOG),
+                           max_sessions = args.max_sessions or (ASYNC_MAX_SESSIONS if asyncio_mode else MAX_SESSIONS),
+                           queue_size = args.queue_size, queue_wait = args.queue_wait, overload = args.overload,
+                           drain_timeout = args.drain_timeout, session_budget = args.session_budget,
+                           profile_path = args.profile_path, profile_sample = args.profile_sample, profile_seconds = args.profile_seconds,
+                           profile_functions = tuple(dict.fromkeys(name for name in args.profile_functions.split(",") if name)),
+                           recorder = session_recorder(args.record, args.record_sample) if args.record else None)
+    try:
+        check_profile_settings(config.profile_sample, config.profile_seconds, config.profile_functions)
+    except ValueError as error:
+        raise SystemExit(f"--profile-*: {error}")
+    setup_logging(config.log_level, config.log_moves)
+
+    log.info("[STARTING] server is starting...")
+    if args.workers > 1:
+        run_workers(host, args.port, args.mode, config, args.workers, args.stats_interval)
+        return None
+
+    server = create_listener(host, args.port, config.backlog)
+    if config.metrics_port:
+        start_metrics_server(config.metrics_port, config)
+    serve(server, args.mode, config)
+
+#|=================================================================================================================================================================
+
+if __name__ == '__main__':
+    main()